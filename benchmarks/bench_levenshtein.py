@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк расстояния Левенштейна для has_significant_changes
+
+Сравнивает полную матрицу с пороговым битово-параллельным вариантом (Майерс)
+на сообщениях разной длины. Запуск: python -m benchmarks.bench_levenshtein
+"""
+import random
+import timeit
+
+from bot.utils.text_distance import bounded_levenshtein_distance, levenshtein_distance
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя ,."
+# has_significant_changes требует схожести не ниже 0.6
+SIMILARITY_THRESHOLD = 0.6
+
+
+def make_pair(length: int, error_rate: float, rng: random.Random):
+    """Исходный текст и его копия с опечатками"""
+    original = "".join(rng.choice(ALPHABET) for _ in range(length))
+    chars = list(original)
+    for _ in range(int(length * error_rate)):
+        position = rng.randrange(len(chars))
+        action = rng.random()
+        if action < 0.4:
+            chars[position] = rng.choice(ALPHABET)
+        elif action < 0.7:
+            chars.insert(position, rng.choice(ALPHABET))
+        elif len(chars) > 1:
+            del chars[position]
+    return original, "".join(chars)
+
+
+def check_correctness(rng: random.Random, rounds: int = 300):
+    """Пороговый вариант совпадает с полной матрицей в пределах порога"""
+    for _ in range(rounds):
+        s1, s2 = make_pair(rng.randint(0, 60), rng.random(), rng)
+        k = rng.randint(0, 40)
+        expected = levenshtein_distance(s1, s2)
+        actual = bounded_levenshtein_distance(s1, s2, k)
+        assert actual == (expected if expected <= k else k + 1), (s1, s2, k)
+
+
+def main():
+    rng = random.Random(42)
+    check_correctness(rng)
+
+    print(f"{'длина':>6} {'ошибки':>7} {'полная, мс':>11} {'порог, мс':>10} {'ускорение':>10}")
+    for length in (100, 500, 2000, 4000):
+        for error_rate in (0.02, 0.6):
+            s1, s2 = make_pair(length, error_rate, rng)
+            k = int(max(len(s1), len(s2)) * (1 - SIMILARITY_THRESHOLD))
+            number = 3 if length >= 2000 else 10
+
+            full = timeit.timeit(lambda: levenshtein_distance(s1, s2), number=number)
+            bounded = timeit.timeit(
+                lambda: bounded_levenshtein_distance(s1, s2, k), number=number
+            )
+
+            full_ms = full / number * 1000
+            bounded_ms = bounded / number * 1000
+            print(
+                f"{length:>6} {error_rate:>7.0%} {full_ms:>11.2f} {bounded_ms:>10.2f} "
+                f"{full_ms / bounded_ms:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест конвейера коррекции без Telegram и Gemini
+
+Гоняет обработчики UserBotService и AIService на заглушках: модель с
+настраиваемой задержкой и долей ошибок вместо generate_content_async и
+поток исходящих сообщений с message.edit вместо Telethon. N пользователей
+пишут в среднем M сообщений в секунду (пуассоновский поток).
+
+Запуск: python -m benchmarks.load_test --users 50 --rate 0.5 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+# Правильное написание -> типичная опечатка
+TYPOS = {
+    "привет": "привед",
+    "сегодня": "седня",
+    "вчера": "вчира",
+    "пошёл": "пашел",
+    "делаешь": "делаеш",
+    "конечно": "канешно",
+    "спасибо": "спасиба",
+    "что-нибудь": "чтонибудь",
+    "пожалуйста": "пожалуста",
+    "встретимся": "встретемся",
+    "завтра": "завтро",
+    "напиши": "напеши",
+}
+WORDS = list(TYPOS) + [
+    "я", "ты", "мы", "дома", "работа", "вечером", "после", "обеда",
+    "магазин", "кино", "давай", "позвоню", "тебе", "будет", "время",
+]
+FIXES = {typo: word for word, typo in TYPOS.items()}
+
+SINGLE_MARKER = "ИСХОДНЫЙ ТЕКСТ: "
+BATCH_MARKER = "СООБЩЕНИЯ: "
+SEGMENT_MARKER = "ФРАГМЕНТЫ: "
+
+
+def fix_text(text: str) -> str:
+    """Эталонное исправление: опечатки по словарю, заглавная буква и точка"""
+    words = text.split()
+    fixed = [FIXES.get(word, word) for word in words]
+    if fixed == words:
+        return text
+    result = " ".join(fixed)
+    return result[0].upper() + result[1:] + "."
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FakeGeminiModel:
+    """Заглушка GenerativeModel: задержка, ошибки и ответы по схеме AIService"""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, rng: random.Random):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = rng
+        self.calls = 0
+        self.batch_calls = 0
+        self.errors = 0
+
+    async def generate_content_async(self, prompt: str, generation_config: Any = None):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("fake Gemini error")
+
+        if SEGMENT_MARKER in prompt or BATCH_MARKER in prompt:
+            self.batch_calls += 1
+            marker = SEGMENT_MARKER if SEGMENT_MARKER in prompt else BATCH_MARKER
+            items = json.loads(prompt.rsplit(marker, 1)[1])
+            payload = [
+                {"id": item["id"], "corrected_text": fix_text(item["text"])}
+                for item in items
+            ]
+        else:
+            text = prompt.rsplit(SINGLE_MARKER, 1)[1].strip()
+            payload = {"corrected_text": fix_text(text)}
+
+        return SimpleNamespace(text=json.dumps(payload, ensure_ascii=False))
+
+
+class FakeMessage:
+    """Исходящее сообщение Telethon с заглушкой edit"""
+
+    def __init__(self, message_id: int, text: str, harness: "LoadTest"):
+        self.id = message_id
+        self.text = text
+        self.fwd_from = None
+        self.media = None
+        self.harness = harness
+
+    async def edit(self, text: str):
+        harness = self.harness
+        harness.edits += 1
+        latency = harness.rng.gauss(harness.edit_latency, harness.edit_latency / 4)
+        await asyncio.sleep(max(0.0, latency))
+
+        if harness.rng.random() < harness.edit_error_rate:
+            harness.edit_errors += 1
+            raise RuntimeError("fake edit error")
+        self.text = text
+
+
+class FakeClient:
+    """Заглушка TelegramClient: только регистрация обработчиков"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, event_builder):
+        def decorator(handler):
+            if handler not in self.handlers:
+                self.handlers.append(handler)
+            return handler
+
+        return decorator
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.edit_latency = args.edit_latency
+        self.edit_error_rate = args.edit_error_rate
+        self.edits = 0
+        self.edit_errors = 0
+        self.emitted = 0
+        self.submitted = 0
+        self.latencies: List[float] = []
+        self.loop_lags: List[float] = []
+        self._emitted_at: Dict[Any, float] = {}
+        self._history: List[str] = []
+
+    def make_text(self) -> str:
+        # Часть сообщений повторяется - так проверяется кеш исправлений
+        if self._history and self.rng.random() > self.args.unique:
+            return self.rng.choice(self._history)
+
+        words = [self.rng.choice(WORDS) for _ in range(self.rng.randint(4, 12))]
+        words = [
+            TYPOS[word] if word in TYPOS and self.rng.random() < self.args.typo_rate else word
+            for word in words
+        ]
+        text = " ".join(words)
+        self._history.append(text)
+        return text
+
+    def instrument(self, debouncer):
+        """Замер сквозной задержки: от события до конца обработки"""
+        submit = debouncer.submit
+
+        def timed_submit(key, factory, delay=None):
+            self.submitted += 1
+
+            async def timed():
+                try:
+                    await factory()
+                finally:
+                    emitted_at = self._emitted_at.pop(key, None)
+                    if emitted_at is not None:
+                        self.latencies.append(time.perf_counter() - emitted_at)
+
+            submit(key, timed, delay)
+
+        debouncer.submit = timed_submit
+
+    async def monitor_loop_lag(self, interval: float = 0.01):
+        """Опоздание пробуждений цикла событий"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lags.append(time.perf_counter() - started - interval)
+
+    async def user_loop(self, handler, user_id: int, deadline: float):
+        """Поток сообщений одного пользователя"""
+        chat_id = user_id * 1000
+        message_id = 0
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.args.rate))
+            if time.perf_counter() >= deadline:
+                return
+
+            message_id += 1
+            message = FakeMessage(message_id, self.make_text(), self)
+            self._emitted_at[(user_id, chat_id, message_id)] = time.perf_counter()
+            self.emitted += 1
+            await handler(SimpleNamespace(chat_id=chat_id, message=message))
+
+    async def run(self) -> Dict[str, Any]:
+        from bot.database.database import close_db, init_db
+        from bot.services.userbot_service import CORRECTION_OUTCOMES, UserBotService
+
+        await init_db()
+        service = UserBotService()
+        model = FakeGeminiModel(
+            self.args.gemini_latency,
+            self.args.gemini_jitter,
+            self.args.gemini_error_rate,
+            self.rng,
+        )
+        service.ai_service.gemini.model = model
+        self.instrument(service.edit_debouncer)
+
+        handlers = []
+        for user_id in range(1, self.args.users + 1):
+            client = FakeClient()
+            await service._setup_handlers(client, user_id)
+            handlers.append((user_id, client.handlers[0]))
+
+        lag_task = asyncio.create_task(self.monitor_loop_lag())
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        await asyncio.gather(
+            *(self.user_loop(handler, user_id, deadline) for user_id, handler in handlers)
+        )
+
+        # Дожидаемся обработки уже принятых сообщений
+        drain_deadline = time.perf_counter() + self.args.drain_timeout
+        while service.edit_debouncer.stats()["pending"] and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        lag_task.cancel()
+        await close_db()
+
+        processed = len(self.latencies)
+        return {
+            "users": self.args.users,
+            "rate_per_user": self.args.rate,
+            "elapsed_s": round(elapsed, 2),
+            "messages": self.emitted,
+            "prefiltered": self.emitted - self.submitted,
+            "processed": processed,
+            "throughput_msg_s": round(processed / elapsed, 2) if elapsed else 0.0,
+            "outcomes": {
+                outcome: int(CORRECTION_OUTCOMES.value(outcome=outcome))
+                for outcome in ("filtered", "unchanged", "corrected", "error")
+            },
+            "latency_ms": {
+                name: round(percentile(self.latencies, q) * 1000, 1)
+                for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+            },
+            "gemini": {
+                "calls": model.calls,
+                "batch_calls": model.batch_calls,
+                "errors": model.errors,
+                "calls_per_message": round(model.calls / processed, 3) if processed else 0.0,
+            },
+            "edits": {
+                "calls": self.edits,
+                "errors": self.edit_errors,
+                "calls_per_message": round(self.edits / processed, 3) if processed else 0.0,
+            },
+            "loop_lag_ms": {
+                name: round(percentile(self.loop_lags, q) * 1000, 2)
+                for name, q in (("p50", 50), ("p99", 99), ("max", 100))
+            },
+            "components": service.stats(),
+        }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="число пользователей")
+    parser.add_argument("--rate", type=float, default=0.5, help="сообщений в секунду на пользователя")
+    parser.add_argument("--duration", type=float, default=20, help="длительность, с")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="ожидание хвоста очереди, с")
+    parser.add_argument("--gemini-latency", type=float, default=0.4, help="средняя задержка модели, с")
+    parser.add_argument("--gemini-jitter", type=float, default=0.1, help="разброс задержки модели, с")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.01, help="доля ошибок модели")
+    parser.add_argument("--edit-latency", type=float, default=0.05, help="задержка message.edit, с")
+    parser.add_argument("--edit-error-rate", type=float, default=0.0, help="доля ошибок message.edit")
+    parser.add_argument("--typo-rate", type=float, default=0.3, help="вероятность опечатки в слове")
+    parser.add_argument("--unique", type=float, default=0.8, help="доля неповторяющихся сообщений")
+    parser.add_argument(
+        "--backend", default="auto", choices=("auto", "gemini", "local"), help="CORRECTION_BACKEND"
+    )
+    parser.add_argument("--rpm", type=int, default=100000, help="GEMINI_RPM для теста")
+    parser.add_argument("--tpm", type=int, default=100000000, help="GEMINI_TPM для теста")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    return parser.parse_args(argv)
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"Пользователей: {report['users']}, по {report['rate_per_user']} сообщ./с, "
+        f"{report['elapsed_s']} с"
+    )
+    print(
+        f"Сообщений: {report['messages']}, отсечено фильтрами: {report['prefiltered']}, "
+        f"обработано: {report['processed']} ({report['throughput_msg_s']} сообщ./с)"
+    )
+    print(f"Итоги: {report['outcomes']}")
+    latency = report["latency_ms"]
+    print(
+        f"Задержка, мс: p50={latency['p50']} p95={latency['p95']} "
+        f"p99={latency['p99']} max={latency['max']}"
+    )
+    gemini = report["gemini"]
+    print(
+        f"Запросов к модели: {gemini['calls']} (пакетных {gemini['batch_calls']}, "
+        f"ошибок {gemini['errors']}), на сообщение: {gemini['calls_per_message']}"
+    )
+    print(f"Правок на сообщение: {report['edits']['calls_per_message']}")
+    lag = report["loop_lag_ms"]
+    print(f"Задержка цикла событий, мс: p50={lag['p50']} p99={lag['p99']} max={lag['max']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    # Модули читают настройки из окружения при импорте
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "load_test.db")
+    os.environ["GEMINI_RPM"] = str(args.rpm)
+    os.environ["GEMINI_TPM"] = str(args.tpm)
+    os.environ["CORRECTION_CACHE_PERSIST"] = "false"
+    os.environ["CORRECTION_BACKEND"] = args.backend
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+    os.environ.setdefault("API_ID", "0")
+    os.environ.setdefault("API_HASH", "load-test")
+
+    report = asyncio.run(LoadTest(args).run())
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+DB_READER_POOL_SIZE = int(os.getenv("DB_READER_POOL_SIZE", "4"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+
+class ConnectionManager:
+    """Долгоживущие соединения с SQLite: один писатель и пул читателей"""
+
+    def __init__(
+        self,
+        database_path: str,
+        reader_pool_size: int = DB_READER_POOL_SIZE,
+        cache_size_kb: int = DB_CACHE_SIZE_KB,
+    ):
+        self.database_path = database_path
+        self.reader_pool_size = max(1, reader_pool_size)
+        self.cache_size_kb = cache_size_kb
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_queue: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def is_started(self) -> bool:
+        return self._writer is not None
+
+    async def _open_connection(self) -> aiosqlite.Connection:
+        """Открытие соединения с настроенными PRAGMA"""
+        db = await aiosqlite.connect(self.database_path)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute(f"PRAGMA cache_size = -{self.cache_size_kb}")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        return db
+
+    async def start(self):
+        """Открытие соединений (повторный вызов ничего не делает)"""
+        async with self._start_lock:
+            if self.is_started:
+                return
+
+            writer = await self._open_connection()
+            await writer.execute("PRAGMA journal_mode = WAL")
+            await writer.commit()
+
+            self._reader_queue = asyncio.Queue()
+            for _ in range(self.reader_pool_size):
+                reader = await self._open_connection()
+                self._readers.append(reader)
+                self._reader_queue.put_nowait(reader)
+
+            self._writer = writer
+
+        logger.info(
+            f"Пул соединений с БД открыт (читателей: {self.reader_pool_size})"
+        )
+
+    async def close(self):
+        """Закрытие всех соединений"""
+        async with self._start_lock:
+            if not self.is_started:
+                return
+
+            async with self._writer_lock:
+                try:
+                    await self._writer.close()
+                except Exception as e:
+                    logger.error(f"Ошибка закрытия соединения с БД: {e}")
+                self._writer = None
+
+            for reader in self._readers:
+                try:
+                    await reader.close()
+                except Exception as e:
+                    logger.error(f"Ошибка закрытия соединения с БД: {e}")
+
+            self._readers = []
+            self._reader_queue = None
+
+        logger.info("Пул соединений с БД закрыт")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение для чтения из пула"""
+        if not self.is_started:
+            await self.start()
+
+        queue = self._reader_queue
+        db = await queue.get()
+        try:
+            yield db
+        finally:
+            queue.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Единственное соединение для записи (с эксклюзивным доступом)"""
+        if not self.is_started:
+            await self.start()
+
+        async with self._writer_lock:
+            db = self._writer
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
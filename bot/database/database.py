@@ -1,21 +1,64 @@
-import aiosqlite
+import functools
+import inspect
 import os
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Tuple
 import json
 import logging
+import time
 from bot.utils.encryption import session_crypto
+from bot.database.settings_cache import settings_cache
+from bot.database.user_registry import user_registry
+from bot.database.connection import ConnectionManager
+from bot.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "bot_database.db")
 
+db_pool = ConnectionManager(DATABASE_PATH)
+
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_seconds", "Длительность запросов к БД по методам", ("query",)
+)
+
+
+def not_instrumented(func):
+    """Метод, который сам не ходит в БД (например, отвечает из кеша)"""
+    func.__not_instrumented__ = True
+    return func
+
+
+def instrument_queries(cls):
+    """Замер длительности всех асинхронных методов класса работы с БД"""
+    for name, attribute in list(vars(cls).items()):
+        if not isinstance(attribute, staticmethod):
+            continue
+        func = attribute.__func__
+        if not inspect.iscoroutinefunction(func):
+            continue
+        if getattr(func, "__not_instrumented__", False):
+            continue
+
+        def wrap(func, query=f"{cls.__name__}.{name}"):
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                with DB_QUERY_SECONDS.time(query=query):
+                    return await func(*args, **kwargs)
+
+            return timed
+
+        setattr(cls, name, staticmethod(wrap(func)))
+    return cls
+
 
 
 
 
 async def init_db():
     """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    await db_pool.start()
+
+    async with db_pool.writer() as db:
 
         await db.execute(
             """
@@ -58,11 +101,61 @@ async def init_db():
         """
         )
 
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS telethon_sessions (
+                user_id INTEGER PRIMARY KEY,
+                session_data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """
+        )
+
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS correction_cache (
+                cache_key TEXT PRIMARY KEY,
+                corrected_text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """
+        )
+
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_logins (
+                user_id INTEGER PRIMARY KEY,
+                phone_number TEXT NOT NULL,
+                session_data TEXT NOT NULL,
+                phone_code_hash TEXT,
+                expires_at REAL NOT NULL
+            )
+        """
+        )
+
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                storage_key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """
+        )
+
         await db.commit()
     
     logger.info("База данных инициализирована")
 
 
+async def close_db():
+    """Закрытие соединений с базой данных"""
+    await db_pool.close()
+
+
+@instrument_queries
 class UserDatabase:
     """Класс для работы с пользователями в базе данных"""
 
@@ -72,23 +165,54 @@ class UserDatabase:
     ) -> bool:
         """Добавление нового пользователя"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 await db.execute(
                     "INSERT OR REPLACE INTO users (user_id, username, first_name) VALUES (?, ?, ?)",
                     (user_id, username, first_name),
                 )
                 await db.commit()
+                user_registry.invalidate(user_id)
                 return True
         except Exception as e:
             logger.error(f"Ошибка добавления пользователя: {e}")
             return False
 
+    @staticmethod
+    async def add_users(
+        users: List[Tuple[int, Optional[str], Optional[str]]]
+    ) -> bool:
+        """Пакетное добавление новых пользователей (существующие не трогаем)"""
+        try:
+            async with db_pool.writer() as db:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO users (user_id, username, first_name) VALUES (?, ?, ?)",
+                    users,
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка добавления пользователей: {e}")
+            return False
+
+    @staticmethod
+    async def get_recent_users(limit: int) -> List[Dict[str, Any]]:
+        """Последние зарегистрированные пользователи (для прогрева реестра)"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT * FROM users ORDER BY created_at DESC LIMIT ?", (limit,)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                    return [dict(row) for row in reversed(rows)]
+        except Exception as e:
+            logger.error(f"Ошибка получения пользователей: {e}")
+            return []
+
     @staticmethod
     async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
         """Получение информации о пользователе"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 async with db.execute(
                     "SELECT * FROM users WHERE user_id = ?", (user_id,)
                 ) as cursor:
@@ -102,18 +226,20 @@ class UserDatabase:
     async def update_phone_number(user_id: int, phone_number: str) -> bool:
         """Обновление номера телефона пользователя"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 await db.execute(
                     "UPDATE users SET phone_number = ? WHERE user_id = ?",
                     (phone_number, user_id),
                 )
                 await db.commit()
+                user_registry.invalidate(user_id)
                 return True
         except Exception as e:
             logger.error(f"Ошибка обновления номера телефона: {e}")
             return False
 
 
+@instrument_queries
 class UserBotDatabase:
     """Класс для работы с user-ботами в базе данных"""
 
@@ -136,7 +262,7 @@ class UserBotDatabase:
                 logger.warning("Сохраняем сессию без шифрования")
                 encrypted_session = session_string
                 
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 await db.execute(
                     "INSERT INTO user_bots (user_id, phone_number, session_string, is_active) VALUES (?, ?, ?, ?)",
                     (user_id, phone_number, encrypted_session, True),
@@ -148,45 +274,123 @@ class UserBotDatabase:
             logger.error(f"Ошибка добавления user-бота: {e}")
             return False
 
+    @staticmethod
+    def _decrypt_bot_data(bot_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Дешифрование сессии в строке user_bots"""
+        user_id = bot_data.get("user_id")
+
+        if session_crypto and bot_data.get('session_string'):
+            try:
+                bot_data['session_string'] = session_crypto.decrypt_session(bot_data['session_string'])
+                logger.debug(f"Сессия для пользователя {user_id} дешифрована")
+            except Exception as e:
+                logger.error(f"Ошибка дешифрования сессии для пользователя {user_id}: {e}")
+                
+                logger.warning("Возможно, сессия сохранена без шифрования")
+        elif not session_crypto:
+            logger.warning("Шифрование недоступно, используем сессию как есть")
+        return bot_data
+
     @staticmethod
     async def get_user_bot(user_id: int) -> Optional[Dict[str, Any]]:
         """Получение user-бота пользователя с дешифрованием сессии"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 async with db.execute(
                     "SELECT * FROM user_bots WHERE user_id = ? AND is_active = TRUE ORDER BY created_at DESC LIMIT 1",
                     (user_id,),
                 ) as cursor:
                     row = await cursor.fetchone()
-                    if row:
-                        bot_data = dict(row)
-                        
-                        if session_crypto and bot_data.get('session_string'):
-                            try:
-                                bot_data['session_string'] = session_crypto.decrypt_session(bot_data['session_string'])
-                                logger.info(f"Сессия для пользователя {user_id} дешифрована")
-                            except Exception as e:
-                                logger.error(f"Ошибка дешифрования сессии для пользователя {user_id}: {e}")
-                                
-                                logger.warning("Возможно, сессия сохранена без шифрования")
-                        elif not session_crypto:
-                            logger.warning("Шифрование недоступно, используем сессию как есть")
-                        return bot_data
-                    return None
+
+            if row:
+                return UserBotDatabase._decrypt_bot_data(dict(row))
+            return None
         except Exception as e:
             logger.error(f"Ошибка получения user-бота: {e}")
             return None
 
+    @staticmethod
+    async def get_user_bot_info(user_id: int) -> Optional[Dict[str, Any]]:
+        """Получение user-бота без сессии (и без дешифрования)"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT id, user_id, phone_number, is_active, created_at, last_activity FROM user_bots WHERE user_id = ? AND is_active = TRUE ORDER BY created_at DESC LIMIT 1",
+                    (user_id,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                    return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения user-бота: {e}")
+            return None
+
+    @staticmethod
+    async def iter_active_user_bots(
+        batch_size: int = 100,
+        user_filter: Optional[Callable[[int], bool]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Постраничный обход активных user-ботов (последняя запись каждого пользователя)
+
+        user_filter отбирает пользователей до дешифрования сессии, чтобы
+        воркеры не расшифровывали сессии чужих шардов.
+        """
+        last_id = 0
+        while True:
+            try:
+                async with db_pool.reader() as db:
+                    async with db.execute(
+                        """
+                        SELECT * FROM user_bots
+                        WHERE id IN (
+                            SELECT MAX(id) FROM user_bots WHERE is_active = TRUE GROUP BY user_id
+                        ) AND id > ?
+                        ORDER BY id
+                        LIMIT ?
+                        """,
+                        (last_id, batch_size),
+                    ) as cursor:
+                        rows = await cursor.fetchall()
+            except Exception as e:
+                logger.error(f"Ошибка получения активных user-ботов: {e}")
+                return
+
+            if not rows:
+                return
+
+            for row in rows:
+                if user_filter is None or user_filter(row["user_id"]):
+                    yield UserBotDatabase._decrypt_bot_data(dict(row))
+
+            last_id = rows[-1]["id"]
+
+    @staticmethod
+    async def update_last_activity(user_id: int) -> bool:
+        """Отметка времени последней активности user-бота"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "UPDATE user_bots SET last_activity = CURRENT_TIMESTAMP WHERE user_id = ? AND is_active = TRUE",
+                    (user_id,),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка обновления активности user-бота: {e}")
+            return False
+
     @staticmethod
     async def deactivate_user_bot(user_id: int) -> bool:
         """Деактивация user-бота"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 await db.execute(
                     "UPDATE user_bots SET is_active = FALSE WHERE user_id = ?",
                     (user_id,),
                 )
+                await db.execute(
+                    "DELETE FROM telethon_sessions WHERE user_id = ?",
+                    (user_id,),
+                )
                 await db.commit()
                 return True
         except Exception as e:
@@ -194,33 +398,111 @@ class UserBotDatabase:
             return False
 
 
+@instrument_queries
+class TelethonSessionDatabase:
+    """Класс для хранения состояния сессий Telethon (с шифрованием)"""
+
+    @staticmethod
+    async def get_session_data(user_id: int) -> Optional[str]:
+        """Получение дешифрованного состояния сессии"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT session_data FROM telethon_sessions WHERE user_id = ?",
+                    (user_id,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Ошибка получения состояния сессии: {e}")
+            return None
+
+        if not row:
+            return None
+
+        try:
+            return session_crypto.decrypt_session(row["session_data"], cache=False)
+        except Exception as e:
+            logger.error(f"Ошибка дешифрования состояния сессии пользователя {user_id}: {e}")
+            logger.warning("Возможно, состояние сохранено без шифрования")
+            return row["session_data"]
+
+    @staticmethod
+    async def save_session_data(user_id: int, session_data: str) -> bool:
+        """Сохранение состояния сессии с шифрованием"""
+        try:
+            try:
+                encrypted_data = session_crypto.encrypt_session(session_data)
+            except Exception as encrypt_error:
+                logger.error(f"Ошибка шифрования состояния сессии: {encrypt_error}")
+                logger.warning("Сохраняем состояние сессии без шифрования")
+                encrypted_data = session_data
+
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO telethon_sessions (user_id, session_data, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                    (user_id, encrypted_data),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния сессии: {e}")
+            return False
+
+    @staticmethod
+    async def delete_session_data(user_id: int) -> bool:
+        """Удаление состояния сессии"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "DELETE FROM telethon_sessions WHERE user_id = ?", (user_id,)
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления состояния сессии: {e}")
+            return False
+
+
+@instrument_queries
 class UserSettingsDatabase:
     """Класс для работы с настройками пользователей"""
 
     @staticmethod
+    @not_instrumented
     async def get_settings(user_id: int) -> Dict[str, Any]:
         """Получение настроек пользователя"""
+        cached = settings_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        return await UserSettingsDatabase.load_settings(user_id)
+
+    @staticmethod
+    async def load_settings(user_id: int) -> Dict[str, Any]:
+        """Чтение настроек из БД в обход кеша (с заполнением кеша)"""
+        generation = settings_cache.generation(user_id)
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                db.row_factory = aiosqlite.Row
+            async with db_pool.reader() as db:
                 async with db.execute(
                     "SELECT * FROM user_settings WHERE user_id = ?", (user_id,)
                 ) as cursor:
                     row = await cursor.fetchone()
-                    if row:
-                        settings = dict(row)
-
-                        try:
-                            settings["additional_settings"] = json.loads(
-                                settings.get("settings_json", "{}")
-                            )
-                        except:
-                            settings["additional_settings"] = {}
-                        return settings
-                    else:
-
-                        await UserSettingsDatabase.create_default_settings(user_id)
-                        return await UserSettingsDatabase.get_settings(user_id)
+
+            if row:
+                settings = dict(row)
+
+                try:
+                    settings["additional_settings"] = json.loads(
+                        settings.get("settings_json", "{}")
+                    )
+                except:
+                    settings["additional_settings"] = {}
+                settings_cache.set(user_id, settings, generation)
+                return settings
+            else:
+
+                await UserSettingsDatabase.create_default_settings(user_id)
+                return await UserSettingsDatabase.load_settings(user_id)
         except Exception as e:
             logger.error(f"Ошибка получения настроек: {e}")
             return {}
@@ -229,12 +511,13 @@ class UserSettingsDatabase:
     async def create_default_settings(user_id: int) -> bool:
         """Создание настроек по умолчанию"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 await db.execute(
                     "INSERT OR REPLACE INTO user_settings (user_id) VALUES (?)",
                     (user_id,),
                 )
                 await db.commit()
+                settings_cache.invalidate(user_id)
                 return True
         except Exception as e:
             logger.error(f"Ошибка создания настроек по умолчанию: {e}")
@@ -244,7 +527,7 @@ class UserSettingsDatabase:
     async def update_setting(user_id: int, setting_name: str, value: Any) -> bool:
         """Обновление конкретной настройки"""
         try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
+            async with db_pool.writer() as db:
                 if setting_name in ["correction_mode", "auto_correct_enabled"]:
                     await db.execute(
                         f"UPDATE user_settings SET {setting_name} = ? WHERE user_id = ?",
@@ -257,8 +540,16 @@ class UserSettingsDatabase:
                     )
                 else:
 
-                    current_settings = await UserSettingsDatabase.get_settings(user_id)
-                    additional = current_settings.get("additional_settings", {})
+                    async with db.execute(
+                        "SELECT settings_json FROM user_settings WHERE user_id = ?",
+                        (user_id,),
+                    ) as cursor:
+                        row = await cursor.fetchone()
+
+                    try:
+                        additional = json.loads(row["settings_json"] or "{}") if row else {}
+                    except:
+                        additional = {}
                     additional[setting_name] = value
                     await db.execute(
                         "UPDATE user_settings SET settings_json = ? WHERE user_id = ?",
@@ -266,10 +557,158 @@ class UserSettingsDatabase:
                     )
 
                 await db.commit()
+                settings_cache.invalidate(user_id)
                 return True
         except Exception as e:
             logger.error(f"Ошибка обновления настройки: {e}")
             return False
 
 
+@instrument_queries
+class CorrectionCacheDatabase:
+    """Класс для постоянного хранения кеша исправлений"""
+
+    @staticmethod
+    async def get_correction(cache_key: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """Получение исправления, если оно еще не устарело"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT corrected_text, created_at FROM correction_cache WHERE cache_key = ?",
+                    (cache_key,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+            if not row:
+                return None
+            if ttl > 0 and row["created_at"] + ttl <= time.time():
+                return None
+            return dict(row)
+        except Exception as e:
+            logger.error(f"Ошибка получения исправления из кеша: {e}")
+            return None
+
+    @staticmethod
+    async def save_correction(cache_key: str, corrected_text: str) -> bool:
+        """Сохранение исправления"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO correction_cache (cache_key, corrected_text, created_at) VALUES (?, ?, ?)",
+                    (cache_key, corrected_text, time.time()),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения исправления в кеш: {e}")
+            return False
+
+    @staticmethod
+    async def purge_expired(ttl: float) -> int:
+        """Удаление устаревших исправлений"""
+        if ttl <= 0:
+            return 0
+        try:
+            async with db_pool.writer() as db:
+                cursor = await db.execute(
+                    "DELETE FROM correction_cache WHERE created_at <= ?",
+                    (time.time() - ttl,),
+                )
+                await db.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка очистки кеша исправлений: {e}")
+            return 0
+
+
+@instrument_queries
+class PendingLoginDatabase:
+    """Класс для незавершенных входов в аккаунт (сессия до авторизации, с шифрованием)"""
+
+    @staticmethod
+    async def save_pending_login(
+        user_id: int,
+        phone_number: str,
+        session_string: str,
+        phone_code_hash: Optional[str],
+        expires_at: float,
+    ) -> bool:
+        """Сохранение незавершенного входа"""
+        try:
+            encrypted_session = session_crypto.encrypt_session(session_string)
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "INSERT OR REPLACE INTO pending_logins (user_id, phone_number, session_data, phone_code_hash, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, phone_number, encrypted_session, phone_code_hash, expires_at),
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения входа: {e}")
+            return False
+
+    @staticmethod
+    async def get_pending_login(user_id: int) -> Optional[Dict[str, Any]]:
+        """Незавершенный вход, если он еще не истек"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT * FROM pending_logins WHERE user_id = ? AND expires_at > ?",
+                    (user_id, time.time()),
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+            if not row:
+                return None
+
+            login = dict(row)
+            login["session_string"] = session_crypto.decrypt_session(
+                login.pop("session_data"), cache=False
+            )
+            return login
+        except Exception as e:
+            logger.error(f"Ошибка получения входа: {e}")
+            return None
+
+    @staticmethod
+    async def delete_pending_login(user_id: int) -> bool:
+        """Удаление незавершенного входа"""
+        try:
+            async with db_pool.writer() as db:
+                await db.execute(
+                    "DELETE FROM pending_logins WHERE user_id = ?", (user_id,)
+                )
+                await db.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления входа: {e}")
+            return False
 
+    @staticmethod
+    async def count_pending_logins(exclude_user_id: Optional[int] = None) -> int:
+        """Число неистекших входов (без входа указанного пользователя)"""
+        try:
+            async with db_pool.reader() as db:
+                async with db.execute(
+                    "SELECT COUNT(*) FROM pending_logins WHERE expires_at > ? AND user_id != ?",
+                    (time.time(), exclude_user_id or 0),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                    return row[0]
+        except Exception as e:
+            logger.error(f"Ошибка подсчета входов: {e}")
+            return 0
+
+    @staticmethod
+    async def purge_expired() -> int:
+        """Удаление истекших входов"""
+        try:
+            async with db_pool.writer() as db:
+                cursor = await db.execute(
+                    "DELETE FROM pending_logins WHERE expires_at <= ?", (time.time(),)
+                )
+                await db.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка очистки входов: {e}")
+            return 0
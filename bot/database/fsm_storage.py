@@ -0,0 +1,213 @@
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+from bot.database.connection import ConnectionManager
+from bot.utils.encryption import session_crypto
+
+
+logger = logging.getLogger(__name__)
+
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+FSM_CACHE_MAX_SIZE = int(os.getenv("FSM_CACHE_MAX_SIZE", "10000"))
+# 0 - кеш не устаревает (один процесс бота); в нескольких процессах чистые
+# записи перечитываются из БД не реже, чем раз в FSM_CACHE_TTL секунд
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "0"))
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM aiogram в нашей SQLite с отложенной записью
+
+    Состояние и данные живут в памяти, изменения пачками сбрасываются
+    в таблицу fsm_states. Ввод кода по цифрам не дергает БД на каждое нажатие.
+    Данные (в том числе набираемый код входа) хранятся зашифрованными.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionManager,
+        key_builder: Optional[KeyBuilder] = None,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        max_size: int = FSM_CACHE_MAX_SIZE,
+        ttl: float = FSM_CACHE_TTL,
+    ):
+        self.pool = pool
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.ttl = ttl
+        self.loads = 0
+        self.flushes = 0
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _record(self, key: StorageKey) -> Dict[str, Any]:
+        """Запись из памяти или из БД"""
+        storage_key = self.key_builder.build(key)
+        record = self._records.get(storage_key)
+
+        if record is not None and (
+            storage_key in self._dirty
+            or self.ttl <= 0
+            or record["loaded_at"] + self.ttl > time.monotonic()
+        ):
+            self._records.move_to_end(storage_key)
+            return record
+
+        async with self.pool.reader() as db:
+            async with db.execute(
+                "SELECT state, data FROM fsm_states WHERE storage_key = ?",
+                (storage_key,),
+            ) as cursor:
+                row = await cursor.fetchone()
+
+        self.loads += 1
+        record = {
+            "key": storage_key,
+            "state": row["state"] if row else None,
+            "data": self._decode_data(storage_key, row["data"]) if row else {},
+            "loaded_at": time.monotonic(),
+        }
+        self._remember(record)
+        return record
+
+    @staticmethod
+    def _encode_data(data: Dict[str, Any]) -> str:
+        return session_crypto.encrypt_session(json.dumps(data, ensure_ascii=False))
+
+    @staticmethod
+    def _decode_data(storage_key: str, value: Optional[str]) -> Dict[str, Any]:
+        if not value:
+            return {}
+        try:
+            # Записи до шифрования хранились открытым JSON
+            if not value.startswith("{"):
+                value = session_crypto.decrypt_session(value, cache=False)
+            return json.loads(value)
+        except Exception as e:
+            logger.error(f"Данные FSM {storage_key} не прочитаны: {e}")
+            return {}
+
+    def _remember(self, record: Dict[str, Any]):
+        self._records[record["key"]] = record
+        self._records.move_to_end(record["key"])
+
+        # Вытесняем только сброшенные в БД записи
+        while len(self._records) > self.max_size:
+            for storage_key in self._records:
+                if storage_key not in self._dirty:
+                    del self._records[storage_key]
+                    break
+            else:
+                break
+
+    def _mark_dirty(self, record: Dict[str, Any]):
+        self._dirty.add(record["key"])
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Пакетная запись измененных состояний"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            written = False
+            try:
+                upserts = []
+                deletes = []
+                for storage_key in dirty:
+                    record = self._records.get(storage_key)
+                    if record is None:
+                        continue
+                    if record["state"] is None and not record["data"]:
+                        deletes.append((storage_key,))
+                    else:
+                        upserts.append(
+                            (
+                                storage_key,
+                                record["state"],
+                                self._encode_data(record["data"]),
+                                time.time(),
+                            )
+                        )
+
+                async with self.pool.writer() as db:
+                    if upserts:
+                        await db.executemany(
+                            "INSERT OR REPLACE INTO fsm_states (storage_key, state, data, updated_at) VALUES (?, ?, ?, ?)",
+                            upserts,
+                        )
+                    if deletes:
+                        await db.executemany(
+                            "DELETE FROM fsm_states WHERE storage_key = ?", deletes
+                        )
+                    await db.commit()
+                written = True
+                self.flushes += 1
+            except Exception as e:
+                logger.error(f"Ошибка сохранения состояний FSM: {e}")
+                if self._flush_task is None or self._flush_task.done():
+                    self._flush_task = asyncio.create_task(self._flush_later())
+            finally:
+                # Не теряем изменения (и при отмене): запишем со следующей пачкой
+                if not written:
+                    self._dirty |= dirty
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record["state"] = state.state if isinstance(state, State) else state
+        self._mark_dirty(record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._record(key)
+        return record["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        record["data"] = copy.deepcopy(data)
+        self._mark_dirty(record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._record(key)
+        return copy.deepcopy(record["data"])
+
+    async def close(self) -> None:
+        """Сброс несохраненных изменений (повторный вызов безопасен)"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики хранилища"""
+        return {
+            "cached": len(self._records),
+            "dirty": len(self._dirty),
+            "loads": self.loads,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,80 @@
+import copy
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "0"))
+
+
+class SettingsCache:
+    """Кеш настроек пользователей в памяти процесса"""
+
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        # ttl <= 0 - записи живут до явной инвалидации
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[int, Tuple[Dict[str, Any], float]] = {}
+        self._generations: Dict[int, int] = {}
+        self._listeners: List[Callable[[int], None]] = []
+
+    def add_invalidation_listener(self, listener: Callable[[int], None]):
+        """Подписка на инвалидацию (например, для других процессов)"""
+        self._listeners.append(listener)
+
+    def generation(self, user_id: int) -> int:
+        """Номер поколения настроек (растет при каждой инвалидации)"""
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получение настроек из кеша"""
+        entry = self._entries.get(user_id)
+
+        if entry is not None:
+            settings, expires_at = entry
+            if self.ttl <= 0 or expires_at > time.monotonic():
+                self.hits += 1
+                return copy.deepcopy(settings)
+            del self._entries[user_id]
+
+        self.misses += 1
+        return None
+
+    def set(
+        self, user_id: int, settings: Dict[str, Any], generation: Optional[int] = None
+    ):
+        """Сохранение настроек в кеш"""
+        # Не кладем в кеш данные, прочитанные до параллельного обновления
+        if generation is not None and generation != self.generation(user_id):
+            return
+
+        self._entries[user_id] = (
+            copy.deepcopy(settings),
+            time.monotonic() + self.ttl,
+        )
+
+    def invalidate(self, user_id: int):
+        """Сброс настроек пользователя"""
+        self._entries.pop(user_id, None)
+        self._generations[user_id] = self.generation(user_id) + 1
+
+        for listener in self._listeners:
+            listener(user_id)
+
+    def clear(self):
+        """Полная очистка кеша"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+settings_cache = SettingsCache()
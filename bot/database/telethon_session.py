@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, StringSession
+from telethon.tl.types.updates import State
+
+from bot.database.database import TelethonSessionDatabase
+
+logger = logging.getLogger(__name__)
+
+# Сколько сущностей (пользователей, чатов) хранится в сессии, старые вытесняются
+SESSION_MAX_ENTITIES = int(os.getenv("SESSION_MAX_ENTITIES", "5000"))
+
+
+class DatabaseSession(MemorySession):
+    """Сессия Telethon, сохраняемая в нашей БД в зашифрованном виде
+
+    Telethon работает с сессией синхронно, поэтому состояние живет в памяти,
+    а в БД сбрасывается асинхронно через flush(). Сущности хранятся по одной
+    строке на id (последней по времени), не больше max_entities.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        session_string: Optional[str] = None,
+        max_entities: int = SESSION_MAX_ENTITIES,
+    ):
+        super().__init__()
+        self.user_id = user_id
+        self.max_entities = max_entities
+        # id сущности -> строка из _entities, в порядке последнего обновления
+        self._entity_rows: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._dirty = False
+        self._deleted = False
+        self._flush_lock = asyncio.Lock()
+        self._pending_tasks = set()
+
+        if session_string:
+            string_session = StringSession(session_string)
+            self._dc_id = string_session.dc_id
+            self._server_address = string_session.server_address
+            self._port = string_session.port
+            self._auth_key = string_session.auth_key
+            self._dirty = True
+
+    @classmethod
+    async def load(
+        cls, user_id: int, session_string: Optional[str] = None
+    ) -> "DatabaseSession":
+        """Сессия из БД (с кешем сущностей и состоянием обновлений)"""
+        session = cls(user_id, session_string)
+
+        data = await TelethonSessionDatabase.get_session_data(user_id)
+        if not data:
+            return session
+
+        try:
+            state = json.loads(data)
+        except json.JSONDecodeError as e:
+            logger.error(f"Поврежденное состояние сессии пользователя {user_id}: {e}")
+            return session
+
+        # После повторного входа ключ новый - старые сущности и состояние не годятся
+        if session_string and state.get("auth_key") != session._encode_auth_key():
+            logger.info(f"Ключ сессии пользователя {user_id} сменился, холодный старт")
+            return session
+
+        session._apply_state(state)
+        return session
+
+    def _encode_auth_key(self) -> Optional[str]:
+        if self._auth_key is None:
+            return None
+        return base64.b64encode(self._auth_key.key).decode("ascii")
+
+    def _to_state(self) -> Dict[str, Any]:
+        """Сериализуемое состояние сессии"""
+        return {
+            "dc_id": self._dc_id,
+            "server_address": self._server_address,
+            "port": self._port,
+            "auth_key": self._encode_auth_key(),
+            "takeout_id": self._takeout_id,
+            "entities": [list(row) for row in self._entity_rows.values()],
+            "update_states": {
+                str(entity_id): [
+                    state.pts,
+                    state.qts,
+                    state.date.timestamp(),
+                    state.seq,
+                    state.unread_count,
+                ]
+                for entity_id, state in self._update_states.items()
+            },
+        }
+
+    def _apply_state(self, state: Dict[str, Any]):
+        """Восстановление состояния из БД"""
+        self._dc_id = state.get("dc_id") or 0
+        self._server_address = state.get("server_address")
+        self._port = state.get("port")
+        self._takeout_id = state.get("takeout_id")
+
+        auth_key = state.get("auth_key")
+        if auth_key:
+            self._auth_key = AuthKey(data=base64.b64decode(auth_key))
+
+        self._entities = set()
+        self._entity_rows.clear()
+        self._store_entities(tuple(row) for row in state.get("entities", []))
+        self._update_states = {
+            int(entity_id): State(
+                pts=pts,
+                qts=qts,
+                date=datetime.fromtimestamp(date, tz=timezone.utc),
+                seq=seq,
+                unread_count=unread_count,
+            )
+            for entity_id, (pts, qts, date, seq, unread_count) in state.get(
+                "update_states", {}
+            ).items()
+        }
+        self._dirty = False
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty = True
+
+    @property
+    def auth_key(self):
+        return self._auth_key
+
+    @auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty = True
+
+    def process_entities(self, tlo):
+        if not self.save_entities:
+            return
+        if self._store_entities(self._entities_to_rows(tlo)):
+            self._dirty = True
+
+    def _store_entities(self, rows) -> bool:
+        """Замена строк сущностей по id с вытеснением давно не обновлявшихся"""
+        changed = False
+        for row in rows:
+            entity_id = row[0]
+            old_row = self._entity_rows.pop(entity_id, None)
+            self._entity_rows[entity_id] = row
+            if old_row == row:
+                continue
+            if old_row is not None:
+                self._entities.discard(old_row)
+            self._entities.add(row)
+            changed = True
+
+        while len(self._entity_rows) > self.max_entities:
+            _, old_row = self._entity_rows.popitem(last=False)
+            self._entities.discard(old_row)
+            changed = True
+        return changed
+
+    def _schedule(self, coro):
+        """Запуск сохранения из синхронного кода Telethon"""
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    def save(self):
+        """Вызывается Telethon при смене ключа авторизации или DC
+
+        При остановке клиента Telethon сессию не сохраняет - это делает
+        flush() при отключении бота и в проверках наблюдателя.
+        """
+        if self._dirty and not self._deleted:
+            self._schedule(self.flush())
+
+    def delete(self):
+        """Вызывается Telethon при выходе из аккаунта"""
+        self._deleted = True
+        self._schedule(TelethonSessionDatabase.delete_session_data(self.user_id))
+
+    async def flush(self):
+        """Сохранение изменений в БД"""
+        async with self._flush_lock:
+            if self._deleted or not self._dirty:
+                return
+
+            self._dirty = False
+            data = json.dumps(self._to_state(), ensure_ascii=False)
+            if not await TelethonSessionDatabase.save_session_data(self.user_id, data):
+                self._dirty = True
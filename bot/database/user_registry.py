@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+USER_REGISTRY_MAX_SIZE = int(os.getenv("USER_REGISTRY_MAX_SIZE", "100000"))
+USER_REGISTRY_FLUSH_INTERVAL = float(os.getenv("USER_REGISTRY_FLUSH_INTERVAL", "1"))
+
+NewUser = Tuple[int, Optional[str], Optional[str]]
+
+
+class UserRegistry:
+    """Известные пользователи в памяти и отложенная запись новых"""
+
+    def __init__(
+        self,
+        max_size: int = USER_REGISTRY_MAX_SIZE,
+        flush_interval: float = USER_REGISTRY_FLUSH_INTERVAL,
+    ):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._users: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[int, NewUser] = {}
+        self._writer: Optional[Callable[[List[NewUser]], Awaitable[bool]]] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def warm(self, rows: List[Dict[str, Any]]):
+        """Заполнение реестра при старте"""
+        for row in rows:
+            self.put(row)
+        logger.info(f"Реестр пользователей прогрет: {len(self._users)}")
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Пользователь из памяти (None - нужно заглянуть в БД)"""
+        user = self._users.get(user_id)
+        if user is None:
+            self.misses += 1
+            return None
+
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return dict(user)
+
+    def put(self, user: Dict[str, Any]):
+        """Сохранение строки пользователя"""
+        user_id = user["user_id"]
+        self._users.pop(user_id, None)
+        self._users[user_id] = dict(user)
+
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Сброс пользователя после изменения в БД"""
+        self._users.pop(user_id, None)
+
+    def register(
+        self, user_id: int, username: Optional[str], first_name: Optional[str]
+    ):
+        """Новый пользователь: сразу известен, в БД попадет со следующей записью"""
+        self._pending[user_id] = (user_id, username, first_name)
+        self.put(
+            {
+                "user_id": user_id,
+                "username": username,
+                "first_name": first_name,
+                "phone_number": None,
+                "created_at": None,
+                "is_active": True,
+            }
+        )
+        self._wakeup.set()
+
+    def start(self, writer: Callable[[List[NewUser]], Awaitable[bool]]):
+        """Запуск фоновой записи новых пользователей"""
+        self._writer = writer
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Копим вставки, чтобы писать их одной транзакцией
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Запись накопленных новых пользователей"""
+        if not self._pending or self._writer is None:
+            return
+
+        batch, self._pending = self._pending, {}
+
+        written = False
+        try:
+            written = await self._writer(list(batch.values()))
+        finally:
+            # Неудачная или прерванная запись - пачка вернется в очередь
+            if not written:
+                for user_id, user in batch.items():
+                    self._pending.setdefault(user_id, user)
+
+        if written:
+            # Следующее обращение подтянет из БД настоящую строку
+            for user_id in batch:
+                self.invalidate(user_id)
+
+    async def close(self):
+        """Остановка фоновой записи с дозаписью очереди"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и очередь записи"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._users),
+            "pending_writes": len(self._pending),
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+user_registry = UserRegistry()
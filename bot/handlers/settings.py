@@ -135,7 +135,7 @@ async def userbot_settings_handler(callback: CallbackQuery):
     """Настройки управления user-ботом"""
     user_id = callback.from_user.id
 
-    bot_data = await UserBotDatabase.get_user_bot(user_id)
+    bot_data = await UserBotDatabase.get_user_bot_info(user_id)
     is_connected = bot_data is not None
     is_active = userbot_service.is_bot_active(user_id) if is_connected else False
 
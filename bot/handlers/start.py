@@ -5,6 +5,7 @@ from aiogram.fsm.context import FSMContext
 
 from bot.keyboards.keyboards import get_main_menu, get_back_keyboard
 from bot.database.database import UserDatabase
+from bot.handlers.user_management import pending_logins
 
 router = Router()
 
@@ -13,6 +14,7 @@ router = Router()
 async def start_handler(message: Message, state: FSMContext):
     """Обработчик команды /start"""
     await state.clear()
+    await pending_logins.cancel(message.from_user.id)
 
     user = message.from_user
     await UserDatabase.add_user(
@@ -135,6 +137,7 @@ async def back_to_main_handler(callback: CallbackQuery, state: FSMContext):
 async def cancel_handler(callback: CallbackQuery, state: FSMContext):
     """Отмена текущего действия"""
     await state.clear()
+    await pending_logins.cancel(callback.from_user.id)
 
     await callback.message.edit_text(
         "❌ <b>Действие отменено</b>",
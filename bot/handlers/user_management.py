@@ -15,7 +15,8 @@ from bot.keyboards.keyboards import (
     get_code_display_text,
 )
 from bot.database.database import UserBotDatabase, UserDatabase
-from bot.services.userbot_service import UserBotService
+from bot.services.userbot_workers import create_userbot_service
+from bot.services.pending_logins import PendingLoginStore
 
 router = Router()
 
@@ -26,8 +27,8 @@ class UserBotConnection(StatesGroup):
     waiting_for_password = State()
 
 
-temp_clients = {}
-userbot_service = UserBotService()
+userbot_service = create_userbot_service()
+pending_logins = PendingLoginStore(userbot_service.resume_session)
 
 
 @router.callback_query(F.data == "connect_userbot")
@@ -35,7 +36,7 @@ async def connect_userbot_handler(callback: CallbackQuery, state: FSMContext):
     """Начало процесса подключения user-бота"""
     user_id = callback.from_user.id
 
-    existing_bot = await UserBotDatabase.get_user_bot(user_id)
+    existing_bot = await UserBotDatabase.get_user_bot_info(user_id)
     if existing_bot:
         await callback.message.edit_text(
             "⚠️ <b>Внимание!</b>\n\n"
@@ -73,16 +74,23 @@ async def phone_received_handler(message: Message, state: FSMContext):
     phone_number = message.contact.phone_number
     user_id = message.from_user.id
 
+    if not await pending_logins.has_capacity(user_id):
+        await message.answer(
+            "⏳ Сейчас слишком много подключений. Попробуйте через несколько минут.",
+            reply_markup=get_main_menu(),
+        )
+        await state.clear()
+        return
+
     await message.answer("⏳ Отправляем код подтверждения...", reply_markup=None)
 
     result = await userbot_service.create_session(phone_number)
 
     if result["success"]:
 
-        temp_clients[user_id] = {
-            "client": result["client"],
-            "phone_number": phone_number,
-        }
+        await pending_logins.add(
+            user_id, result["client"], phone_number, result["phone_code_hash"]
+        )
 
         await message.answer(
             f"📲 <b>Код отправлен!</b>\n\n"
@@ -184,7 +192,8 @@ async def code_submit_handler(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Код должен состоять из 5 цифр!", show_alert=True)
         return
 
-    if user_id not in temp_clients:
+    login = await pending_logins.get(user_id)
+    if login is None:
         await callback.message.edit_text(
             "❌ Сессия истекла. Начните подключение заново.",
             reply_markup=get_main_menu(),
@@ -192,15 +201,16 @@ async def code_submit_handler(callback: CallbackQuery, state: FSMContext):
         await state.clear()
         return
 
-    client_data = temp_clients[user_id]
-    client = client_data["client"]
-    phone_number = client_data["phone_number"]
+    client = login["client"]
+    phone_number = login["phone_number"]
 
     await callback.message.edit_text(
         "⏳ <b>Проверяем код...</b>", parse_mode="HTML"
     )
 
-    result = await userbot_service.verify_code(client, phone_number, current_code)
+    result = await userbot_service.verify_code(
+        client, phone_number, current_code, login["phone_code_hash"]
+    )
 
     if result["success"]:
 
@@ -227,9 +237,7 @@ async def code_submit_handler(callback: CallbackQuery, state: FSMContext):
                 parse_mode="HTML",
             )
 
-        if user_id in temp_clients:
-            await temp_clients[user_id]["client"].disconnect()
-            del temp_clients[user_id]
+        await pending_logins.complete(user_id)
 
         await state.clear()
 
@@ -270,7 +278,8 @@ async def password_received_handler(message: Message, state: FSMContext):
     password = message.text
     user_id = message.from_user.id
 
-    if user_id not in temp_clients:
+    login = await pending_logins.get(user_id)
+    if login is None:
         await message.answer(
             "❌ Сессия истекла. Начните подключение заново.",
             reply_markup=get_main_menu(),
@@ -278,9 +287,8 @@ async def password_received_handler(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    client_data = temp_clients[user_id]
-    client = client_data["client"]
-    phone_number = client_data["phone_number"]
+    client = login["client"]
+    phone_number = login["phone_number"]
 
     await message.answer("⏳ Проверяем пароль...")
 
@@ -309,9 +317,7 @@ async def password_received_handler(message: Message, state: FSMContext):
                 reply_markup=get_main_menu(),
             )
 
-        if user_id in temp_clients:
-            await temp_clients[user_id]["client"].disconnect()
-            del temp_clients[user_id]
+        await pending_logins.complete(user_id)
 
         await state.clear()
     else:
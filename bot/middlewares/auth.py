@@ -2,6 +2,7 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User
 from bot.database.database import UserDatabase
+from bot.database.user_registry import user_registry
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -17,13 +18,21 @@ class AuthMiddleware(BaseMiddleware):
 
         if user:
 
-            db_user = await UserDatabase.get_user(user.id)
+            # Известные пользователи обслуживаются из памяти, без запроса к БД
+            db_user = user_registry.get(user.id)
 
-            if not db_user:
+            if db_user is None:
 
-                await UserDatabase.add_user(
-                    user_id=user.id, username=user.username, first_name=user.first_name
-                )
+                db_user = await UserDatabase.get_user(user.id)
+
+                if db_user:
+                    user_registry.put(db_user)
+                else:
+                    user_registry.register(
+                        user_id=user.id,
+                        username=user.username,
+                        first_name=user.first_name,
+                    )
 
             data["db_user"] = db_user
 
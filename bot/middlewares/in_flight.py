@@ -0,0 +1,55 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+# 0 - не больше WEBHOOK_MAX_CONNECTIONS (больше Telegram одновременно и не пришлет)
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "0"))
+
+
+class InFlightLimitMiddleware(BaseMiddleware):
+    """Ограничение числа одновременно обрабатываемых апдейтов
+
+    Webhook отвечает Telegram после обработки, поэтому ожидание места
+    задерживает ответ и число ожидающих не превышает max_connections.
+    Лимит имеет смысл только меньше max_connections.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.processed = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Загрузка обработчика апдейтов"""
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "processed": self.processed,
+        }
@@ -1,163 +1,246 @@
 import os
-import json
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
-import re
+import time
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from bot.services.correction_backend import (
+    CORRECTION_BACKEND,
+    CorrectionBackend,
+    CorrectionRouter,
+)
+from bot.services.correction_cache import CorrectionCache
+from bot.services.gemini_backend import CORRECTION_VERSION, SEGMENT_VERSION, GeminiBackend
+from bot.services.local_corrector import LocalCorrector, WordSetLexicon
+from bot.services.prefilter import SPELLCHECK_DICTIONARY, load_word_set
+from bot.utils.sentences import splice, split_sentences
+from bot.utils.spell_index import get_spell_index
+from bot.utils.text_distance import has_significant_changes, levenshtein_distance
+from bot.services.text_executor import text_executor
+from bot.database.database import CorrectionCacheDatabase
+
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
+CORRECTION_CACHE_PERSIST = os.getenv("CORRECTION_CACHE_PERSIST", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Длинные сообщения отправляются в Gemini по предложениям (0 - всегда целиком)
+CORRECTION_SEGMENT_MIN_LENGTH = int(os.getenv("CORRECTION_SEGMENT_MIN_LENGTH", "400"))
+# Доля подозрительных предложений, выше которой выгоднее отправить текст целиком
+CORRECTION_SEGMENT_MAX_RATIO = float(os.getenv("CORRECTION_SEGMENT_MAX_RATIO", "0.5"))
+# Сколько соседних предложений с каждой стороны отправляется для контекста
+CORRECTION_SEGMENT_CONTEXT = int(os.getenv("CORRECTION_SEGMENT_CONTEXT", "1"))
+
+
 class AIService:
-    """Сервис для работы с ИИ (Gemini)"""
-    
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY не найден в переменных окружения")
-        
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash-exp")
-
-    async def correct_text(self, text: str) -> str:
-        """Исправление орфографических и грамматических ошибок"""
-        try:
-            prompt = f"""
-Ты - профессиональный редактор русского языка. Твоя задача - исправить ВСЕ орфографические, грамматические, пунктуационные и стилистические ошибки в тексте.
-
-ПРАВИЛА ИСПРАВЛЕНИЯ:
-- Исправь все опечатки и орфографические ошибки
-- Исправь грамматические ошибки (падежи, времена, согласования)
-- Расставь правильную пунктуацию
-- Исправь порядок слов, если он неправильный
-- Замени неподходящие слова на правильные синонимы
-- Сохрани исходный смысл и стиль сообщения
-- Не добавляй лишних слов, не убирай важную информацию
-- Сохрани эмоциональную окраску (разговорный стиль, сленг и т.д.)
-
-ИСХОДНЫЙ ТЕКСТ: {text}
-"""
-            
-            response_schema = {
-                "type": "object",
-                "properties": {
-                    "corrected_text": {
-                        "type": "string",
-                        "description": "Исправленный текст без дополнительных комментариев"
-                    }
-                },
-                "required": ["corrected_text"]
-            }
-            
-            
-            generation_config = GenerationConfig(
-                response_mime_type="application/json",
-                response_schema=response_schema,
-                temperature=0.1,  
-                max_output_tokens=2048,
-            )
-            
-            
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            
+    """Сервис исправления текста: кеш и выбор движка (Gemini или локальный)"""
+
+    def __init__(
+        self,
+        gemini: Optional[CorrectionBackend] = None,
+        local: Optional[CorrectionBackend] = None,
+    ):
+        if gemini is None:
             try:
-                response_json = json.loads(response.text)
-                corrected_text = response_json.get("corrected_text", "").strip()
-                
-                
-                if corrected_text:
-                    return corrected_text
-                else:
-                    logger.warning("Получен пустой исправленный текст")
-                    return text
-                    
-            except json.JSONDecodeError as json_error:
-                logger.error(f"Ошибка парсинга JSON: {json_error}")
-                logger.error(f"Ответ модели: {response.text}")
-                return text
-                
-        except Exception as e:
-            logger.error(f"Ошибка при исправлении текста: {e}")
+                gemini = GeminiBackend()
+            except ValueError as e:
+                if CORRECTION_BACKEND == "gemini":
+                    raise
+                # Без ключа работаем только локальным движком
+                logger.warning(f"Gemini недоступен, исправляем локально: {e}")
+
+        if local is None:
+            local = LocalCorrector(self._load_lexicon())
+
+        self.gemini = gemini
+        self.local = local
+        self.router = CorrectionRouter(local, gemini)
+        self.correction_cache = CorrectionCache()
+        self.persist_cache = CORRECTION_CACHE_PERSIST
+        self.segment_min_length = CORRECTION_SEGMENT_MIN_LENGTH
+        self.segment_max_ratio = CORRECTION_SEGMENT_MAX_RATIO
+        self.segment_context = CORRECTION_SEGMENT_CONTEXT
+        self.segmented = 0
+        self.sentences_total = 0
+        self.sentences_sent = 0
+
+    @staticmethod
+    def _load_lexicon():
+        """Индекс словаря, иначе множество слов из SPELLCHECK_DICTIONARY"""
+        index = get_spell_index()
+        if index is not None:
+            return index
+
+        words = load_word_set(SPELLCHECK_DICTIONARY)
+        return WordSetLexicon(words) if words is not None else None
+
+    def suspect_spans(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """Участки текста с вероятными ошибками (None - словаря нет)"""
+        return self.local.suspect_spans(text)
+
+    async def correct_text(self, text: str, user_id: Optional[int] = None) -> str:
+        """Исправление орфографических и грамматических ошибок"""
+        cache_key = CorrectionCache.make_key(text, CORRECTION_VERSION)
+
+        cached = await self._get_cached_correction(cache_key)
+        if cached is not None:
+            return cached
+
+        backends = self.router.route(text)
+        plan = self._plan_segments(text) if backends[0] is self.gemini else None
+        if plan is not None:
+            corrected_text = await self._correct_segments(text, *plan, user_id=user_id)
+            if corrected_text is not None:
+                return corrected_text
+            # Запрос не удался - переходим к резервному движку
+            backends = backends[1:]
+
+        for backend in backends:
+            corrected_text = await backend.correct(text, user_id)
+            if corrected_text is not None:
+                break
+        else:
             return text
 
-    def _extract_corrected_text(self, response_text: str, original_text: str) -> str:
-        """Резервный метод для извлечения исправленного текста (если JSON не сработает)"""
-        try:
-            
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx]
-                parsed = json.loads(json_str)
-                return parsed.get("corrected_text", original_text)
-            
-            return original_text
-            
-        except Exception:
-            return original_text
+        if backend.cacheable:
+            self.correction_cache.set(cache_key, corrected_text)
+            if self.persist_cache:
+                await CorrectionCacheDatabase.save_correction(cache_key, corrected_text)
+
+        return corrected_text
+
+    def _plan_segments(
+        self, text: str
+    ) -> Optional[Tuple[List[Tuple[int, int]], List[int]]]:
+        """Предложения сообщения и номера подозрительных (None - отправлять целиком)"""
+        if self.segment_min_length <= 0 or len(text) < self.segment_min_length:
+            return None
+        if not self.gemini.supports_segments:
+            return None
+
+        spans = self.local.suspect_spans(text)
+        if not spans:
+            return None
+
+        sentences = split_sentences(text)
+        flagged = [
+            index
+            for index, (start, end) in enumerate(sentences)
+            if any(start <= span_start < end for span_start, _ in spans)
+        ]
+        if not flagged or len(flagged) > len(sentences) * self.segment_max_ratio:
+            return None
+        return sentences, flagged
+
+    async def _correct_segments(
+        self,
+        text: str,
+        sentences: List[Tuple[int, int]],
+        flagged: List[int],
+        user_id: Optional[int] = None,
+    ) -> Optional[str]:
+        """Исправление только подозрительных предложений
+
+        Остальные предложения остаются как есть, поэтому ответ модели и
+        время генерации растут с числом ошибок, а не с длиной сообщения.
+        None - запрос не удался.
+        """
+        replacements = []
+        pending = []
+        for index in flagged:
+            start, end = sentences[index]
+            cache_key = CorrectionCache.make_key(text[start:end], SEGMENT_VERSION)
+            cached = await self._get_cached_correction(cache_key)
+            if cached is not None:
+                replacements.append((start, end, cached))
+            else:
+                pending.append((index, cache_key))
+
+        if pending:
+            segments = [self._segment_with_context(text, sentences, index) for index, _ in pending]
+            results = await self.gemini.correct_segments(segments, user_id)
+            if results is None:
+                return None
+
+            for (index, cache_key), corrected in zip(pending, results):
+                if corrected is None:
+                    continue
+                start, end = sentences[index]
+                replacements.append((start, end, corrected))
+                self.correction_cache.set(cache_key, corrected)
+                if self.persist_cache:
+                    await CorrectionCacheDatabase.save_correction(cache_key, corrected)
+
+        self.segmented += 1
+        self.sentences_total += len(sentences)
+        self.sentences_sent += len(pending)
+        return splice(text, replacements)
+
+    def _segment_with_context(
+        self, text: str, sentences: List[Tuple[int, int]], index: int
+    ) -> Tuple[str, str, str]:
+        """Предложение и соседние с ним (до, предложение, после)"""
+        start, end = sentences[index]
+        first = max(0, index - self.segment_context)
+        last = min(len(sentences) - 1, index + self.segment_context)
+        before = text[sentences[first][0] : start].strip() if first < index else ""
+        after = text[end : sentences[last][1]].strip() if last > index else ""
+        return before, text[start:end], after
+
+    async def _get_cached_correction(self, cache_key: str) -> Optional[str]:
+        """Поиск исправления в памяти, затем в БД"""
+        cached = self.correction_cache.get(cache_key)
+        if cached is not None or not self.persist_cache:
+            return cached
+
+        ttl = self.correction_cache.ttl
+        row = await CorrectionCacheDatabase.get_correction(cache_key, ttl)
+        if row is None:
+            return None
+
+        expires_at = None
+        if ttl > 0:
+            remaining = row["created_at"] + ttl - time.time()
+            expires_at = time.monotonic() + remaining
+        self.correction_cache.set(cache_key, row["corrected_text"], expires_at)
+        self.correction_cache.record_hit()
+        return row["corrected_text"]
 
     def has_significant_changes(self, original: str, processed: str) -> bool:
         """Проверка, есть ли существенные изменения между оригиналом и обработанным текстом"""
-        if original == processed:
-            return False
-
-        original_normalized = re.sub(r"\s+", " ", original.strip())
-        processed_normalized = re.sub(r"\s+", " ", processed.strip())
-
-        if original_normalized == processed_normalized:
-            return False
-
-        original_words = re.findall(r"\w+", original.lower())
-        processed_words = re.findall(r"\w+", processed.lower())
-
-        if (
-            len(processed_words) == 0
-            or abs(len(original_words) - len(processed_words))
-            > len(original_words) * 0.5
-        ):
-            return False
-
-        distance = self._levenshtein_distance(
-            original_normalized.lower(), processed_normalized.lower()
+        return has_significant_changes(original, processed)
+
+    async def has_significant_changes_async(self, original: str, processed: str) -> bool:
+        """То же, но длинные тексты сравниваются вне цикла событий"""
+        return await text_executor.run(
+            has_significant_changes,
+            original,
+            processed,
+            size=max(len(original), len(processed)),
         )
-        similarity = 1 - (
-            distance / max(len(original_normalized), len(processed_normalized))
-        )
-
-        if similarity < 0.6:
-            logger.warning(
-                f"Слишком большие изменения (схожесть: {similarity:.2f}), пропускаем"
-            )
-            return False
-
-        return distance > 0
 
     def _levenshtein_distance(self, s1: str, s2: str) -> int:
         """Вычисление расстояния Левенштейна"""
-        if len(s1) < len(s2):
-            return self._levenshtein_distance(s2, s1)
-
-        if len(s2) == 0:
-            return len(s1)
-
-        previous_row = list(range(len(s2) + 1))
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-
-        return previous_row[-1]
+        return levenshtein_distance(s1, s2)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кеша, маршрутизации и движков"""
+        stats = {
+            "correction_cache": self.correction_cache.stats(),
+            "routed": self.router.stats(),
+            "segments": {
+                "messages": self.segmented,
+                "sentences": self.sentences_total,
+                "sent": self.sentences_sent,
+            },
+            "local": self.local.stats(),
+        }
+        if self.gemini is not None:
+            stats["gemini"] = self.gemini.stats()
+        return stats
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import random
+from typing import TYPE_CHECKING, Dict, Optional
+
+from telethon import TelegramClient, functions
+from telethon.errors import (
+    AuthKeyDuplicatedError,
+    AuthKeyUnregisteredError,
+    SessionRevokedError as TelegramSessionRevokedError,
+    UserDeactivatedBanError,
+    UserDeactivatedError,
+)
+
+from bot.database.database import UserBotDatabase
+
+if TYPE_CHECKING:
+    from bot.services.userbot_service import UserBotService
+
+
+logger = logging.getLogger(__name__)
+
+USERBOT_RECONNECT_ATTEMPTS = int(os.getenv("USERBOT_RECONNECT_ATTEMPTS", "8"))
+USERBOT_RECONNECT_BACKOFF = float(os.getenv("USERBOT_RECONNECT_BACKOFF", "2"))
+USERBOT_RECONNECT_MAX_DELAY = float(os.getenv("USERBOT_RECONNECT_MAX_DELAY", "300"))
+USERBOT_PROBE_INTERVAL = float(os.getenv("USERBOT_PROBE_INTERVAL", "60"))
+USERBOT_PROBE_TIMEOUT = float(os.getenv("USERBOT_PROBE_TIMEOUT", "15"))
+
+# Ошибки, после которых сессию уже не восстановить
+AUTH_REVOKED_ERRORS = (
+    AuthKeyUnregisteredError,
+    AuthKeyDuplicatedError,
+    TelegramSessionRevokedError,
+    UserDeactivatedError,
+    UserDeactivatedBanError,
+)
+
+
+class SessionRevokedError(Exception):
+    """Сессия отозвана или больше не авторизована"""
+
+
+class ClientSupervisor:
+    """Наблюдение за клиентами user-ботов: переподключение и проверка живости"""
+
+    def __init__(self, service: "UserBotService"):
+        self.service = service
+        self.reconnects = 0
+        self.removed = 0
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def watch(self, user_id: int, client: TelegramClient):
+        """Запуск наблюдения за клиентом (вместо run_until_disconnected)"""
+        self.unwatch(user_id)
+        self._tasks[user_id] = asyncio.create_task(self._supervise(user_id, client))
+
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    def unwatch(self, user_id: int):
+        """Снятие наблюдения перед штатной остановкой"""
+        task = self._tasks.pop(user_id, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    def shutdown(self):
+        """Остановка всех наблюдателей"""
+        for user_id in list(self._tasks):
+            self.unwatch(user_id)
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def _is_current(self, user_id: int, client: TelegramClient) -> bool:
+        return self.service.active_bots.get(user_id) is client
+
+    async def _supervise(self, user_id: int, client: TelegramClient):
+        """Ожидание отключения и переподключение с экспоненциальной задержкой"""
+        while True:
+            try:
+                await client.run_until_disconnected()
+            except AUTH_REVOKED_ERRORS as e:
+                await self._remove(user_id, client, revoked=True, reason=str(e))
+                return
+            except Exception as e:
+                logger.warning(f"Клиент пользователя {user_id} отключился с ошибкой: {e}")
+
+            if not self._is_current(user_id, client):
+                return
+
+            logger.warning(f"Клиент пользователя {user_id} отключен, переподключаемся")
+            if not await self._reconnect(user_id, client):
+                return
+
+    async def _reconnect(self, user_id: int, client: TelegramClient) -> bool:
+        """Попытки переподключения (False - клиент удален)"""
+        for attempt in range(USERBOT_RECONNECT_ATTEMPTS):
+            delay = min(
+                USERBOT_RECONNECT_MAX_DELAY, USERBOT_RECONNECT_BACKOFF * 2**attempt
+            )
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+            if not self._is_current(user_id, client):
+                return False
+
+            try:
+                await client.connect()
+                if not await client.is_user_authorized():
+                    raise SessionRevokedError("сессия больше не авторизована")
+            except (SessionRevokedError, *AUTH_REVOKED_ERRORS) as e:
+                await self._remove(user_id, client, revoked=True, reason=str(e))
+                return False
+            except Exception as e:
+                logger.warning(
+                    f"Переподключение пользователя {user_id} не удалось (попытка {attempt + 1}): {e}"
+                )
+                continue
+
+            self.reconnects += 1
+            await UserBotDatabase.update_last_activity(user_id)
+            logger.info(f"Клиент пользователя {user_id} переподключен")
+            return True
+
+        # Сеть или Telegram недоступны - в БД бот остается активным до рестарта
+        await self._remove(
+            user_id, client, revoked=False, reason="исчерпаны попытки переподключения"
+        )
+        return False
+
+    async def _remove(
+        self, user_id: int, client: TelegramClient, revoked: bool, reason: str
+    ):
+        """Удаление мертвого клиента из активных"""
+        if not self._is_current(user_id, client):
+            return
+
+        self.removed += 1
+        self.service.active_bots.pop(user_id, None)
+        self.service.recent_edits.pop(user_id, None)
+        self.unwatch(user_id)
+        # Отложенные исправления иначе попытаются править через отключенный клиент
+        self.service.edit_debouncer.cancel_user(user_id)
+
+        if revoked:
+            # Ключ недействителен - не даем сессии записаться обратно
+            client.session.delete()
+
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+        if revoked:
+            await UserBotDatabase.deactivate_user_bot(user_id)
+            logger.error(f"Сессия пользователя {user_id} отозвана ({reason}), user-бот отключен")
+        else:
+            # Как в stop_user_bot: состояние обновлений пригодится при рестарте
+            await client.session.flush()
+            await UserBotDatabase.update_last_activity(user_id)
+            logger.error(f"User-бот пользователя {user_id} остановлен: {reason}")
+
+    async def _probe_loop(self):
+        """Периодическая проверка живости всех клиентов"""
+        while self.service.active_bots:
+            await asyncio.sleep(USERBOT_PROBE_INTERVAL)
+            await asyncio.gather(
+                *(
+                    self._probe(user_id, client)
+                    for user_id, client in list(self.service.active_bots.items())
+                )
+            )
+
+    async def _probe(self, user_id: int, client: TelegramClient):
+        """Дешевый запрос к Telegram: отвечает ли соединение и жива ли авторизация"""
+        # Отключенные клиенты уже обрабатывает наблюдатель
+        if not client.is_connected():
+            return
+
+        try:
+            await asyncio.wait_for(
+                client(functions.updates.GetStateRequest()),
+                timeout=USERBOT_PROBE_TIMEOUT,
+            )
+        except AUTH_REVOKED_ERRORS as e:
+            await self._remove(user_id, client, revoked=True, reason=str(e))
+            return
+        except Exception as e:
+            logger.warning(f"Клиент пользователя {user_id} не отвечает: {e}")
+            # Разрыв соединения передает клиента наблюдателю на переподключение
+            await client.disconnect()
+            return
+
+        # Заодно сбрасываем накопившиеся сущности и состояние обновлений
+        await client.session.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики наблюдателя"""
+        return {
+            "watched": len(self._tasks),
+            "reconnects": self.reconnects,
+            "removed": self.removed,
+        }
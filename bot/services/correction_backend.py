@@ -0,0 +1,129 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# auto - локально простые сообщения, остальное в Gemini; gemini или local - только один
+CORRECTION_BACKEND = os.getenv("CORRECTION_BACKEND", "auto").lower()
+CORRECTION_LOCAL_MAX_LENGTH = int(os.getenv("CORRECTION_LOCAL_MAX_LENGTH", "200"))
+BACKEND_FAILURE_THRESHOLD = int(os.getenv("BACKEND_FAILURE_THRESHOLD", "5"))
+BACKEND_RETRY_AFTER = float(os.getenv("BACKEND_RETRY_AFTER", "30"))
+
+
+class CorrectionBackend(ABC):
+    """Движок исправления текста
+
+    Подряд идущие сбои выключают движок на BACKEND_RETRY_AFTER секунд,
+    после чего пропускается пробный запрос.
+    """
+
+    name = "base"
+    # Стоит ли сохранять результаты в кеш исправлений
+    cacheable = True
+    # Умеет ли исправлять отдельные фрагменты сообщения (correct_segments)
+    supports_segments = False
+
+    def __init__(
+        self,
+        failure_threshold: int = BACKEND_FAILURE_THRESHOLD,
+        retry_after: float = BACKEND_RETRY_AFTER,
+    ):
+        self.failure_threshold = failure_threshold
+        self.retry_after = retry_after
+        self.consecutive_failures = 0
+        self.failures = 0
+        self._last_failure = 0.0
+
+    @abstractmethod
+    async def correct(self, text: str, user_id: Optional[int] = None) -> Optional[str]:
+        """Исправленный текст (None - исправить не удалось)"""
+
+    async def correct_segments(
+        self, segments: List[Tuple[str, str, str]], user_id: Optional[int] = None
+    ) -> Optional[List[Optional[str]]]:
+        """Исправленные фрагменты (текст до, фрагмент, текст после)
+
+        Элемент None - фрагмент не исправлен, результат None - не удалось.
+        """
+        return None
+
+    def can_handle(self, text: str) -> bool:
+        """Уверен ли движок, что справится без более дорогого"""
+        return True
+
+    def suspect_spans(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """Участки текста с вероятными ошибками (None - движок не может судить)"""
+        return None
+
+    @property
+    def available(self) -> bool:
+        if self.consecutive_failures < self.failure_threshold:
+            return True
+        return time.monotonic() - self._last_failure >= self.retry_after
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._last_failure = time.monotonic()
+        if self.consecutive_failures == self.failure_threshold:
+            logger.error(f"Движок {self.name} недоступен, переключаемся на резервный")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "available": int(self.available),
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class CorrectionRouter:
+    """Выбор движков для сообщения (по порядку попыток)"""
+
+    def __init__(
+        self,
+        local: CorrectionBackend,
+        remote: Optional[CorrectionBackend],
+        mode: str = CORRECTION_BACKEND,
+        local_max_length: int = CORRECTION_LOCAL_MAX_LENGTH,
+    ):
+        self.local = local
+        self.remote = remote
+        self.mode = mode
+        self.local_max_length = local_max_length
+        self.routed: Dict[str, int] = {}
+
+    def route(self, text: str) -> List[CorrectionBackend]:
+        backends = self._choose(text)
+        first = backends[0].name
+        self.routed[first] = self.routed.get(first, 0) + 1
+        return backends
+
+    def _choose(self, text: str) -> List[CorrectionBackend]:
+        if self.mode == "local" or self.remote is None:
+            return [self.local]
+        if self.mode == "gemini":
+            return [self.remote]
+
+        # Удаленный движок лежит - обходимся локальным
+        if not self.remote.available:
+            return [self.local]
+
+        # Все слова известны словарю - орфографию модели отдавать незачем,
+        # локальный движок вернет такой текст без изменений
+        if self.local.suspect_spans(text) == []:
+            return [self.local]
+
+        if len(text) <= self.local_max_length and self.local.can_handle(text):
+            return [self.local]
+
+        return [self.remote, self.local]
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.routed)
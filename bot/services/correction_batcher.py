@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from bot.services.rate_governor import RateLimitTimeout
+
+
+logger = logging.getLogger(__name__)
+
+CORRECTION_BATCH_WINDOW = float(os.getenv("CORRECTION_BATCH_WINDOW", "0.05"))
+CORRECTION_BATCH_MAX_ITEMS = int(os.getenv("CORRECTION_BATCH_MAX_ITEMS", "8"))
+CORRECTION_BATCH_MAX_TOKENS = int(os.getenv("CORRECTION_BATCH_MAX_TOKENS", "2000"))
+
+# Отправители получают дедлайн ожидания лимита (момент time.monotonic() или None)
+BatchSender = Callable[[List[Tuple[int, str]], Optional[float]], Awaitable[Dict[int, str]]]
+SingleSender = Callable[[str, Optional[float]], Awaitable[Optional[str]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (для кириллицы ~3 символа на токен)"""
+    return len(text) // 3 + 1
+
+
+class CorrectionBatcher:
+    """Сбор сообщений всех user-ботов в пакетные запросы к модели"""
+
+    def __init__(
+        self,
+        send_batch: BatchSender,
+        send_single: SingleSender,
+        window: float = CORRECTION_BATCH_WINDOW,
+        max_items: int = CORRECTION_BATCH_MAX_ITEMS,
+        max_tokens: int = CORRECTION_BATCH_MAX_TOKENS,
+    ):
+        self.send_batch = send_batch
+        self.send_single = send_single
+        self.window = window
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+
+        self.batches_sent = 0
+        self.batch_failures = 0
+
+        self._pending: List[Tuple[int, str, Optional[float], asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._next_id = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 1
+
+    async def submit(self, text: str, deadline: Optional[float] = None) -> Optional[str]:
+        """Постановка текста в очередь и ожидание исправления"""
+        if not self.enabled:
+            return await self.send_single(text, deadline)
+
+        loop = asyncio.get_running_loop()
+        tokens = estimate_tokens(text)
+
+        # Не превышаем бюджет токенов - сначала отправляем накопленное
+        if self._pending and self._pending_tokens + tokens > self.max_tokens:
+            self._flush()
+
+        future = loop.create_future()
+        self._next_id += 1
+        self._pending.append((self._next_id, text, deadline, future))
+        self._pending_tokens += tokens
+
+        if (
+            len(self._pending) >= self.max_items
+            or self._pending_tokens >= self.max_tokens
+        ):
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Отправка накопленного пакета"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        items, self._pending = self._pending, []
+        self._pending_tokens = 0
+        if not items:
+            return
+
+        task = asyncio.create_task(self._run_batch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(
+        self, items: List[Tuple[int, str, Optional[float], asyncio.Future]]
+    ):
+        """Выполнение пакета с откатом на поштучные запросы"""
+        results: Dict[int, str] = {}
+
+        if len(items) > 1:
+            # Пакет ждет лимит не дольше самого срочного сообщения
+            deadlines = [deadline for _, _, deadline, _ in items if deadline is not None]
+            try:
+                results = await self.send_batch(
+                    [(item_id, text) for item_id, text, _, _ in items],
+                    min(deadlines) if deadlines else None,
+                )
+                self.batches_sent += 1
+            except RateLimitTimeout as e:
+                # Поштучные запросы упрутся в тот же лимит
+                logger.warning(f"Пропускаем пакет ({len(items)} шт.): {e}")
+                for _, _, _, future in items:
+                    if not future.done():
+                        future.set_result(None)
+                return
+            except Exception as e:
+                self.batch_failures += 1
+                logger.error(f"Ошибка пакетного исправления ({len(items)} шт.): {e}")
+
+        async def resolve(
+            item_id: int, text: str, deadline: Optional[float], future: asyncio.Future
+        ):
+            corrected_text = results.get(item_id)
+            if corrected_text is None:
+                try:
+                    corrected_text = await self.send_single(text, deadline)
+                except Exception as e:
+                    logger.error(f"Ошибка при исправлении текста: {e}")
+                    corrected_text = None
+            if not future.done():
+                future.set_result(corrected_text)
+
+        await asyncio.gather(
+            *(resolve(*item) for item in items)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики пакетов"""
+        return {
+            "batches_sent": self.batches_sent,
+            "batch_failures": self.batch_failures,
+            "pending": len(self._pending),
+        }
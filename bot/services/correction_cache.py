@@ -0,0 +1,81 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+CORRECTION_CACHE_TTL = float(os.getenv("CORRECTION_CACHE_TTL", "86400"))
+CORRECTION_CACHE_MAX_SIZE = int(os.getenv("CORRECTION_CACHE_MAX_SIZE", "5000"))
+
+
+class CorrectionCache:
+    """LRU-кеш исправлений с ограничением по времени жизни"""
+
+    def __init__(
+        self,
+        ttl: float = CORRECTION_CACHE_TTL,
+        max_size: int = CORRECTION_CACHE_MAX_SIZE,
+    ):
+        # ttl <= 0 - записи вытесняются только по размеру
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(text: str, version: str) -> str:
+        """Ключ кеша: хеш точного текста и версии промпта/модели
+
+        Текст не нормализуется: исправление повторяет переносы строк и пробелы
+        исходного сообщения, и чужое форматирование вернулось бы пользователю.
+        """
+        # Префикс отделяет ключи от прежних, посчитанных по нормализованному тексту
+        payload = f"exact\x00{version}\x00{text or ''}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Получение исправления из кеша"""
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            corrected_text, expires_at = entry
+            if self.ttl <= 0 or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return corrected_text
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, corrected_text: str, expires_at: Optional[float] = None):
+        """Сохранение исправления в кеш"""
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl
+
+        self._entries.pop(key, None)
+        self._entries[key] = (corrected_text, expires_at)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def record_hit(self):
+        """Попадание, найденное во внешнем хранилище"""
+        self.misses -= 1
+        self.hits += 1
+
+    def clear(self):
+        """Полная очистка кеша"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
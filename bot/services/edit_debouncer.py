@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+logger = logging.getLogger(__name__)
+
+EDIT_DEBOUNCE_DELAY = float(os.getenv("EDIT_DEBOUNCE_DELAY", "1.5"))
+
+
+class MessageDebouncer:
+    """Одна задача коррекции на сообщение: новые правки отменяют старые"""
+
+    def __init__(self, delay: float = EDIT_DEBOUNCE_DELAY):
+        self.delay = delay
+        self.scheduled = 0
+        self.superseded = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        delay: float = None,
+    ):
+        """Планирование обработки; ожидающая или выполняемая задача по ключу отменяется"""
+        if delay is None:
+            delay = self.delay
+
+        previous = self._tasks.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self.superseded += 1
+
+        self.scheduled += 1
+        self._tasks[key] = asyncio.create_task(self._run(key, factory, delay))
+
+    async def _run(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]], delay: float
+    ):
+        try:
+            # Ждем тишины: правка в этот период заменит задачу
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await factory()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._tasks.get(key) is asyncio.current_task():
+                del self._tasks[key]
+
+    def cancel(self, key: Hashable):
+        """Отмена задачи по ключу (новое содержимое обрабатывать не нужно)"""
+        task = self._tasks.pop(key, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.superseded += 1
+
+    def cancel_user(self, user_id: int):
+        """Отмена всех задач пользователя (ключи начинаются с user_id)"""
+        for key, task in list(self._tasks.items()):
+            if isinstance(key, tuple) and key and key[0] == user_id:
+                task.cancel()
+                del self._tasks[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики задач"""
+        return {
+            "scheduled": self.scheduled,
+            "superseded": self.superseded,
+            "pending": len(self._tasks),
+        }
@@ -0,0 +1,347 @@
+import os
+import json
+import hashlib
+import google.generativeai as genai
+from google.generativeai.types import GenerationConfig
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.services.correction_backend import CorrectionBackend
+from bot.services.correction_batcher import CorrectionBatcher, estimate_tokens
+from bot.services.rate_governor import RateGovernor, RateLimitTimeout
+
+
+logger = logging.getLogger(__name__)
+
+
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+CORRECTION_PROMPT = """
+Ты - профессиональный редактор русского языка. Твоя задача - исправить ВСЕ орфографические, грамматические, пунктуационные и стилистические ошибки в тексте.
+
+ПРАВИЛА ИСПРАВЛЕНИЯ:
+- Исправь все опечатки и орфографические ошибки
+- Исправь грамматические ошибки (падежи, времена, согласования)
+- Расставь правильную пунктуацию
+- Исправь порядок слов, если он неправильный
+- Замени неподходящие слова на правильные синонимы
+- Сохрани исходный смысл и стиль сообщения
+- Не добавляй лишних слов, не убирай важную информацию
+- Сохрани эмоциональную окраску (разговорный стиль, сленг и т.д.)
+
+ИСХОДНЫЙ ТЕКСТ: {text}
+"""
+
+BATCH_CORRECTION_PROMPT = """
+Ты - профессиональный редактор русского языка. Ниже дан JSON-массив независимых сообщений с полями "id" и "text". Исправь в КАЖДОМ сообщении ВСЕ орфографические, грамматические, пунктуационные и стилистические ошибки.
+
+ПРАВИЛА ИСПРАВЛЕНИЯ:
+- Исправь все опечатки и орфографические ошибки
+- Исправь грамматические ошибки (падежи, времена, согласования)
+- Расставь правильную пунктуацию
+- Исправь порядок слов, если он неправильный
+- Замени неподходящие слова на правильные синонимы
+- Сохрани исходный смысл и стиль сообщения
+- Не добавляй лишних слов, не убирай важную информацию
+- Сохрани эмоциональную окраску (разговорный стиль, сленг и т.д.)
+- Исправляй каждое сообщение отдельно, не переноси текст между ними
+- Верни по одному элементу на каждое сообщение с тем же "id"
+
+СООБЩЕНИЯ: {items}
+"""
+
+SEGMENT_CORRECTION_PROMPT = """
+Ты - профессиональный редактор русского языка. Ниже дан JSON-массив фрагментов длинного сообщения с полями "id", "before", "text" и "after". Исправь в поле "text" ВСЕ орфографические, грамматические, пунктуационные и стилистические ошибки. Поля "before" и "after" - соседний текст сообщения, он дан только для контекста.
+
+ПРАВИЛА ИСПРАВЛЕНИЯ:
+- Исправь все опечатки и орфографические ошибки
+- Исправь грамматические ошибки (падежи, времена, согласования)
+- Расставь правильную пунктуацию
+- Сохрани исходный смысл и стиль сообщения
+- Не добавляй лишних слов, не убирай важную информацию
+- Сохрани эмоциональную окраску (разговорный стиль, сленг и т.д.)
+- Возвращай только исправленный "text", без текста из "before" и "after"
+- Верни по одному элементу на каждый фрагмент с тем же "id"
+
+ФРАГМЕНТЫ: {items}
+"""
+
+# Версия промпта и модели - при их изменении старые исправления не используются
+CORRECTION_VERSION = hashlib.sha1(
+    f"{GEMINI_MODEL}\x00{CORRECTION_PROMPT}\x00{BATCH_CORRECTION_PROMPT}".encode("utf-8")
+).hexdigest()[:12]
+SEGMENT_VERSION = hashlib.sha1(
+    f"{GEMINI_MODEL}\x00{SEGMENT_CORRECTION_PROMPT}".encode("utf-8")
+).hexdigest()[:12]
+
+
+class GeminiBackend(CorrectionBackend):
+    """Исправление текста моделью Gemini (пакетами, в пределах лимитов API)"""
+
+    name = "gemini"
+    supports_segments = True
+
+    def __init__(self, api_key: Optional[str] = None):
+        super().__init__()
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY не найден в переменных окружения")
+
+        genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.batcher = CorrectionBatcher(
+            self._request_batch_correction, self._request_correction
+        )
+        self.rate_governor = RateGovernor()
+        self._prompt_tokens = estimate_tokens(CORRECTION_PROMPT)
+        self._segment_prompt_tokens = estimate_tokens(SEGMENT_CORRECTION_PROMPT)
+        self.segment_requests = 0
+
+    async def correct(self, text: str, user_id: Optional[int] = None) -> Optional[str]:
+        # Промпт + исходный текст + ответ примерно той же длины
+        tokens = self._prompt_tokens + estimate_tokens(text) * 2
+        # Один дедлайн на бюджет токенов и слот RPM, а не по дедлайну на каждый
+        deadline = self.rate_governor.make_deadline()
+        if not await self.rate_governor.acquire(user_id, tokens, deadline):
+            logger.warning(
+                f"Лимит запросов к модели исчерпан, пропускаем сообщение пользователя {user_id}"
+            )
+            return None
+
+        return await self.batcher.submit(text, deadline)
+
+    async def _request_correction(
+        self, text: str, deadline: Optional[float] = None
+    ) -> Optional[str]:
+        """Запрос исправления у Gemini (None - если исправить не удалось)"""
+        try:
+            await self.rate_governor.acquire_request(deadline)
+
+            prompt = CORRECTION_PROMPT.format(text=text)
+            
+            response_schema = {
+                "type": "object",
+                "properties": {
+                    "corrected_text": {
+                        "type": "string",
+                        "description": "Исправленный текст без дополнительных комментариев"
+                    }
+                },
+                "required": ["corrected_text"]
+            }
+            
+            
+            generation_config = GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=response_schema,
+                temperature=0.1,  
+                max_output_tokens=2048,
+            )
+            
+            
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=generation_config
+            )
+            
+            
+            try:
+                response_json = json.loads(response.text)
+                corrected_text = response_json.get("corrected_text", "").strip()
+                
+                
+                if corrected_text:
+                    self.record_success()
+                    return corrected_text
+                else:
+                    logger.warning("Получен пустой исправленный текст")
+                    return None
+                    
+            except json.JSONDecodeError as json_error:
+                self.record_failure()
+                logger.error(f"Ошибка парсинга JSON: {json_error}")
+                logger.error(f"Ответ модели: {response.text}")
+                return None
+                
+        except RateLimitTimeout as e:
+            logger.warning(f"Пропускаем исправление: {e}")
+            return None
+        except Exception as e:
+            self.record_failure()
+            logger.error(f"Ошибка при исправлении текста: {e}")
+            return None
+
+    async def _request_batch_correction(
+        self, items: List[Tuple[int, str]], deadline: Optional[float] = None
+    ) -> Dict[int, str]:
+        """Пакетный запрос исправлений (ключ результата - id элемента)"""
+        payload = json.dumps(
+            [{"id": item_id, "text": text} for item_id, text in items],
+            ensure_ascii=False,
+        )
+        prompt = BATCH_CORRECTION_PROMPT.format(items=payload)
+
+        await self.rate_governor.acquire_request(deadline)
+
+        response_schema = {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "corrected_text": {
+                        "type": "string",
+                        "description": "Исправленный текст без дополнительных комментариев"
+                    }
+                },
+                "required": ["id", "corrected_text"]
+            }
+        }
+
+        output_budget = sum(estimate_tokens(text) for _, text in items) * 2 + 64 * len(items)
+        generation_config = GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            temperature=0.1,
+            max_output_tokens=min(8192, max(2048, output_budget)),
+        )
+
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=generation_config
+            )
+            entries = json.loads(response.text)
+            if not isinstance(entries, list) or not all(
+                isinstance(entry, dict) for entry in entries
+            ):
+                raise ValueError(f"неожиданный ответ модели: {response.text[:200]}")
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+
+        expected_ids = {item_id for item_id, _ in items}
+        results = {}
+        for entry in entries:
+            item_id = entry.get("id")
+            corrected_text = entry.get("corrected_text")
+            if not isinstance(corrected_text, str) or not corrected_text.strip():
+                continue
+            if item_id in expected_ids:
+                results[item_id] = corrected_text.strip()
+
+        if len(results) < len(items):
+            logger.warning(
+                f"Пакетный ответ неполный: {len(results)} из {len(items)}"
+            )
+        return results
+
+    async def correct_segments(
+        self, segments: List[Tuple[str, str, str]], user_id: Optional[int] = None
+    ) -> Optional[List[Optional[str]]]:
+        """Исправление фрагментов сообщения одним запросом
+
+        segments - (текст до, фрагмент, текст после); соседний текст только
+        для контекста, в ответе модель возвращает лишь фрагменты. Элемент
+        результата None - фрагмент не исправлен, весь результат None -
+        запрос не удался.
+        """
+        # Промпт + контекст + фрагменты + ответ примерно длины фрагментов
+        tokens = self._segment_prompt_tokens + sum(
+            estimate_tokens(before) + estimate_tokens(text) * 2 + estimate_tokens(after)
+            for before, text, after in segments
+        )
+        deadline = self.rate_governor.make_deadline()
+        if not await self.rate_governor.acquire(user_id, tokens, deadline):
+            logger.warning(
+                f"Лимит запросов к модели исчерпан, пропускаем сообщение пользователя {user_id}"
+            )
+            return None
+
+        payload = json.dumps(
+            [
+                {"id": item_id, "before": before, "text": text, "after": after}
+                for item_id, (before, text, after) in enumerate(segments)
+            ],
+            ensure_ascii=False,
+        )
+        prompt = SEGMENT_CORRECTION_PROMPT.format(items=payload)
+
+        response_schema = {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "corrected_text": {
+                        "type": "string",
+                        "description": "Исправленный фрагмент без дополнительных комментариев"
+                    }
+                },
+                "required": ["id", "corrected_text"]
+            }
+        }
+
+        output_budget = sum(estimate_tokens(text) for _, text, _ in segments) * 2 + 32 * len(segments)
+        generation_config = GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            temperature=0.1,
+            max_output_tokens=min(2048, max(256, output_budget)),
+        )
+
+        try:
+            await self.rate_governor.acquire_request(deadline)
+            self.segment_requests += 1
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=generation_config
+            )
+            entries = json.loads(response.text)
+            if not isinstance(entries, list) or not all(
+                isinstance(entry, dict) for entry in entries
+            ):
+                raise ValueError(f"неожиданный ответ модели: {response.text[:200]}")
+        except RateLimitTimeout as e:
+            logger.warning(f"Пропускаем исправление: {e}")
+            return None
+        except Exception as e:
+            self.record_failure()
+            logger.error(f"Ошибка при исправлении фрагментов: {e}")
+            return None
+        self.record_success()
+
+        results: List[Optional[str]] = [None] * len(segments)
+        for entry in entries:
+            item_id = entry.get("id")
+            corrected_text = entry.get("corrected_text")
+            if not isinstance(corrected_text, str) or not corrected_text.strip():
+                continue
+            if isinstance(item_id, int) and 0 <= item_id < len(segments):
+                results[item_id] = corrected_text.strip()
+        return results
+
+    def _extract_corrected_text(self, response_text: str, original_text: str) -> str:
+        """Резервный метод для извлечения исправленного текста (если JSON не сработает)"""
+        try:
+            
+            start_idx = response_text.find('{')
+            end_idx = response_text.rfind('}') + 1
+            
+            if start_idx != -1 and end_idx > start_idx:
+                json_str = response_text[start_idx:end_idx]
+                parsed = json.loads(json_str)
+                return parsed.get("corrected_text", original_text)
+            
+            return original_text
+            
+        except Exception:
+            return original_text
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "segment_requests": self.segment_requests,
+            "batcher": self.batcher.stats(),
+            "rate_governor": self.rate_governor.stats(),
+        }
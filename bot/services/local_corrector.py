@@ -0,0 +1,232 @@
+import logging
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from bot.services.correction_backend import CorrectionBackend
+
+
+logger = logging.getLogger(__name__)
+
+RUSSIAN_ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+# Частые ошибки, которые исправляются без словаря
+COMMON_MISSPELLINGS: Dict[str, str] = {
+    "извените": "извините",
+    "сдесь": "здесь",
+    "зделать": "сделать",
+    "зделал": "сделал",
+    "зделала": "сделала",
+    "вообщем": "в общем",
+    "вообщемто": "в общем-то",
+    "какбы": "как бы",
+    "тоесть": "то есть",
+    "врятли": "вряд ли",
+    "вродебы": "вроде бы",
+    "всмысле": "в смысле",
+    "незнаю": "не знаю",
+    "немогу": "не могу",
+    "нехочу": "не хочу",
+    "щитаю": "считаю",
+    "седня": "сегодня",
+    "севодня": "сегодня",
+    "сегодя": "сегодня",
+    "кагда": "когда",
+    "пожалуста": "пожалуйста",
+    "пожайлуста": "пожалуйста",
+    "спасиба": "спасибо",
+    "канешно": "конечно",
+    "конешно": "конечно",
+    "будующий": "будущий",
+    "будующее": "будущее",
+    "расчитать": "рассчитать",
+    "росказать": "рассказать",
+    "оплотить": "оплатить",
+    "инциндент": "инцидент",
+    "прецендент": "прецедент",
+    "агенство": "агентство",
+    "учавствовать": "участвовать",
+    "здраствуйте": "здравствуйте",
+}
+
+WORD_RE = re.compile(r"[а-яё]+(?:-[а-яё]+)*", re.I)
+SPACE_BEFORE_PUNCT_RE = re.compile(r"[ \t]+([,.!?;:])")
+MISSING_SPACE_RE = re.compile(r"([,;:])(?=[а-яёa-z])", re.I)
+MULTI_SPACE_RE = re.compile(r"[ \t]{2,}")
+SENTENCE_START_RE = re.compile(r"(^|[.!?…]\s+)([а-яё])")
+# Ссылки, адреса почты и смайлики правила пунктуации не трогают
+PROTECTED_RE = re.compile(
+    r"(?:https?://|www\.|mailto:|tg://)\S+"
+    r"|[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+    r"|\b[\w-]+(?:\.[\w-]+)+/\S*"
+    r"|[:;=][-^'o]?[()\[\]DdPpOo3*|/\\]+"
+)
+# Защищенный участок на время правил заменяется символом из личной области
+PLACEHOLDER_BASE = 0xE000
+PLACEHOLDER_RE = re.compile("[\ue000-\uf8ff]")
+
+
+class WordSetLexicon:
+    """Словарь на множестве слов: подсказки - слова на расстоянии одной правки
+
+    Запасной вариант, когда индекс словаря (SPELL_INDEX_PATH) не построен.
+    """
+
+    def __init__(self, words: FrozenSet[str]):
+        self.words = words
+
+    def is_known(self, word: str) -> bool:
+        return word in self.words
+
+    def suggestions(self, word: str, limit: int = 5) -> List[str]:
+        candidates = []
+        for candidate in self._edits(word):
+            if candidate in self.words and candidate not in candidates:
+                candidates.append(candidate)
+                if len(candidates) >= limit:
+                    break
+        return candidates
+
+    @staticmethod
+    def _edits(word: str) -> Iterable[str]:
+        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+        for left, right in splits:
+            if right:
+                yield left + right[1:]
+            if len(right) > 1:
+                yield left + right[1] + right[0] + right[2:]
+            for letter in RUSSIAN_ALPHABET:
+                if right:
+                    yield left + letter + right[1:]
+                yield left + letter + right
+
+
+def _match_case(original: str, replacement: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class LocalCorrector(CorrectionBackend):
+    """Исправление без сети: частые ошибки, словарь и правила пунктуации
+
+    Слово исправляется, только если замена однозначна. Без словаря
+    незнакомые слова оставляются как есть, и движок не берет такие
+    сообщения на себя в режиме auto.
+    """
+
+    name = "local"
+    # Результат дешево пересчитать - кеш оставляем под ответы модели
+    cacheable = False
+
+    def __init__(
+        self,
+        lexicon=None,
+        misspellings: Optional[Dict[str, str]] = None,
+    ):
+        super().__init__()
+        self.lexicon = lexicon
+        self.misspellings = COMMON_MISSPELLINGS if misspellings is None else misspellings
+        self.corrected = 0
+        self._last: Optional[Tuple[str, Tuple[str, int]]] = None
+
+    def _fix_word(self, word: str) -> Tuple[str, bool]:
+        """Исправление слова и признак уверенности в результате"""
+        lower = word.lower()
+
+        fixed = self.misspellings.get(lower)
+        if fixed is not None:
+            return _match_case(word, fixed), True
+
+        if self.lexicon is None:
+            return word, False
+        if self.lexicon.is_known(lower):
+            return word, True
+
+        suggestions = self.lexicon.suggestions(lower, limit=2)
+        if len(suggestions) == 1:
+            return _match_case(word, suggestions[0]), True
+        return word, False
+
+    def analyze(self, text: str) -> Tuple[str, int]:
+        """Исправленный текст и число слов, которые не удалось проверить"""
+        # Роутер и correct() анализируют одно и то же сообщение подряд
+        if self._last is not None and self._last[0] == text:
+            return self._last[1]
+
+        result = self._analyze(text)
+        self._last = (text, result)
+        return result
+
+    def _analyze(self, text: str) -> Tuple[str, int]:
+        unresolved = 0
+        fixed_words = 0
+
+        def replace(match: re.Match) -> str:
+            nonlocal unresolved, fixed_words
+            word = match.group(0)
+            fixed, confident = self._fix_word(word)
+            if not confident:
+                unresolved += 1
+            elif fixed != word:
+                fixed_words += 1
+            return fixed
+
+        protected = PROTECTED_RE.findall(text)
+        if len(protected) > 0xF8FF - PLACEHOLDER_BASE or PLACEHOLDER_RE.search(text):
+            # Участки не спрятать без риска - оставляем сообщение модели
+            return text, 1
+
+        counter = iter(range(PLACEHOLDER_BASE, PLACEHOLDER_BASE + len(protected)))
+        masked = PROTECTED_RE.sub(lambda match: chr(next(counter)), text)
+
+        corrected = WORD_RE.sub(replace, masked)
+        # Регистр и пробелы сами по себе не повод править сообщение
+        if not fixed_words:
+            return text, unresolved
+
+        corrected = SPACE_BEFORE_PUNCT_RE.sub(r"\1", corrected)
+        corrected = MISSING_SPACE_RE.sub(r"\1 ", corrected)
+        corrected = MULTI_SPACE_RE.sub(" ", corrected)
+        corrected = SENTENCE_START_RE.sub(
+            lambda match: match.group(1) + match.group(2).upper(), corrected
+        )
+        return (
+            PLACEHOLDER_RE.sub(
+                lambda match: protected[ord(match.group(0)) - PLACEHOLDER_BASE], corrected
+            ),
+            unresolved,
+        )
+
+    def suspect_spans(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """Участки с незнакомыми словарю словами и частыми ошибками"""
+        spans = []
+        protected = [match.span() for match in PROTECTED_RE.finditer(text)]
+        for match in WORD_RE.finditer(text):
+            if any(start <= match.start() < end for start, end in protected):
+                continue
+            word = match.group(0).lower()
+            if word in self.misspellings:
+                spans.append(match.span())
+            elif self.lexicon is None:
+                return None
+            elif not self.lexicon.is_known(word):
+                spans.append(match.span())
+        return spans
+
+    def can_handle(self, text: str) -> bool:
+        return self.analyze(text)[1] == 0
+
+    async def correct(self, text: str, user_id: Optional[int] = None) -> Optional[str]:
+        # Без незнакомых слов исправлять нечего - пунктуацию не переписываем
+        if self.suspect_spans(text) == []:
+            return text
+
+        corrected, _ = self.analyze(text)
+        if corrected != text:
+            self.corrected += 1
+        return corrected
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "corrected": self.corrected}
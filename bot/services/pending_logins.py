@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telethon import TelegramClient
+
+from bot.database.database import PendingLoginDatabase
+
+
+logger = logging.getLogger(__name__)
+
+PENDING_LOGIN_TTL = float(os.getenv("PENDING_LOGIN_TTL", "600"))
+PENDING_LOGIN_MAX = int(os.getenv("PENDING_LOGIN_MAX", "100"))
+PENDING_LOGIN_SWEEP_INTERVAL = float(os.getenv("PENDING_LOGIN_SWEEP_INTERVAL", "30"))
+
+
+class PendingLoginStore:
+    """Незавершенные входы в аккаунт: подключенные клиенты с ограниченным сроком жизни
+
+    Клиенты живут в памяти процесса, а сессия до авторизации и хеш кода
+    сохраняются в БД - продолжить вход можно из любого процесса.
+    """
+
+    def __init__(
+        self,
+        resume_client: Callable[[str], Awaitable[TelegramClient]],
+        ttl: float = PENDING_LOGIN_TTL,
+        max_pending: int = PENDING_LOGIN_MAX,
+        sweep_interval: float = PENDING_LOGIN_SWEEP_INTERVAL,
+    ):
+        self.resume_client = resume_client
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.sweep_interval = sweep_interval
+        self.started = 0
+        self.resumed = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.rejected = 0
+        self._logins: Dict[int, Dict[str, Any]] = {}
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def has_capacity(self, user_id: int) -> bool:
+        """Можно ли начать вход (свой прежний вход не считается)"""
+        pending = await PendingLoginDatabase.count_pending_logins(exclude_user_id=user_id)
+        if pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        return True
+
+    async def add(
+        self,
+        user_id: int,
+        client: TelegramClient,
+        phone_number: str,
+        phone_code_hash: Optional[str],
+    ):
+        """Регистрация входа после отправки кода"""
+        await self._disconnect(self._logins.pop(user_id, None))
+
+        login = {
+            "client": client,
+            "phone_number": phone_number,
+            "phone_code_hash": phone_code_hash,
+            "expires_at": time.time() + self.ttl,
+        }
+        self._logins[user_id] = login
+        self.started += 1
+
+        await PendingLoginDatabase.save_pending_login(
+            user_id,
+            phone_number,
+            client.session.save(),
+            phone_code_hash,
+            login["expires_at"],
+        )
+        self._ensure_sweeper()
+
+    def _ensure_sweeper(self):
+        """Запуск фоновой очистки, пока в памяти есть подключенные клиенты"""
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Неистекший вход пользователя (None - нужно начать заново)"""
+        login = self._logins.get(user_id)
+        if login is not None:
+            if login["expires_at"] > time.time():
+                return login
+            await self._expire(user_id)
+            return None
+
+        stored = await PendingLoginDatabase.get_pending_login(user_id)
+        if stored is None:
+            return None
+
+        # Вход начат другим процессом или до перезапуска - поднимаем клиент из сессии
+        try:
+            client = await self.resume_client(stored["session_string"])
+        except Exception as e:
+            logger.error(f"Не удалось продолжить вход пользователя {user_id}: {e}")
+            return None
+
+        login = {
+            "client": client,
+            "phone_number": stored["phone_number"],
+            "phone_code_hash": stored["phone_code_hash"],
+            "expires_at": stored["expires_at"],
+        }
+        self._logins[user_id] = login
+        self.resumed += 1
+        # Брошенный поднятый вход тоже должен закрыться по истечении срока
+        self._ensure_sweeper()
+        return login
+
+    async def complete(self, user_id: int):
+        """Завершение входа: клиент больше не нужен"""
+        await self._discard(user_id)
+        self.completed += 1
+
+    async def cancel(self, user_id: int):
+        """Отмена входа пользователем"""
+        if await self._discard(user_id):
+            self.cancelled += 1
+
+    async def _discard(self, user_id: int) -> bool:
+        login = self._logins.pop(user_id, None)
+        await self._disconnect(login)
+        await PendingLoginDatabase.delete_pending_login(user_id)
+        return login is not None
+
+    async def _expire(self, user_id: int):
+        await self._disconnect(self._logins.pop(user_id, None))
+        await PendingLoginDatabase.delete_pending_login(user_id)
+        self.expired += 1
+        logger.info(f"Вход пользователя {user_id} истек")
+
+    @staticmethod
+    async def _disconnect(login: Optional[Dict[str, Any]]):
+        if login is None:
+            return
+        try:
+            await login["client"].disconnect()
+        except Exception as e:
+            logger.warning(f"Ошибка отключения клиента входа: {e}")
+
+    async def _sweep_loop(self):
+        """Периодическое отключение клиентов брошенных входов"""
+        while self._logins:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    async def sweep(self):
+        """Отключение истекших клиентов и очистка БД"""
+        now = time.time()
+        for user_id in [
+            user_id
+            for user_id, login in self._logins.items()
+            if login["expires_at"] <= now
+        ]:
+            await self._expire(user_id)
+
+        await PendingLoginDatabase.purge_expired()
+
+    async def close(self):
+        """Отключение всех клиентов (записи в БД доживают свой срок)"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+
+        logins, self._logins = self._logins, {}
+        await asyncio.gather(*(self._disconnect(login) for login in logins.values()))
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики входов"""
+        return {
+            "pending": len(self._logins),
+            "started": self.started,
+            "resumed": self.resumed,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "expired": self.expired,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,209 @@
+import functools
+import logging
+from abc import ABC, abstractmethod
+import os
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from telethon.tl.types import MessageMediaWebPage
+
+from bot.utils.spell_index import get_spell_index
+
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_MIN_CYRILLIC_RATIO = float(os.getenv("PREFILTER_MIN_CYRILLIC_RATIO", "0.5"))
+SPELLCHECK_DICTIONARY = os.getenv("SPELLCHECK_DICTIONARY", "")
+
+
+EMOJI_ONLY_RE = re.compile(
+    r"^[\s\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002702-\U000027B0\U000024C2-\U0001F251]+$"
+)
+URL_RE = re.compile(r"(?:https?://|www\.)\S+|\b[\w.-]+\.(?:ru|com|org|net|io|me)\S*", re.I)
+CODE_RE = re.compile(r"```.*?```|`[^`\n]*`", re.S)
+MENTION_RE = re.compile(r"[@#]\w+")
+LETTER_RE = re.compile(r"[^\W\d_]")
+CYRILLIC_RE = re.compile(r"[а-яё]", re.I)
+WORD_RE = re.compile(r"[а-яё]+(?:-[а-яё]+)*", re.I)
+# Признаки небрежного текста, которые видны без словаря
+SLOPPY_RE = re.compile(r"\s[,.!?;:]|[,;:][^\s\d)»\"']|(\w)\1\1|^[а-яё]|  |[^.!?…)]$")
+
+
+class PreFilter(ABC):
+    """Базовый фильтр: отсекает сообщения, которым не нужна коррекция"""
+
+    name = "base"
+
+    def __init__(self):
+        self.rejected = 0
+
+    @abstractmethod
+    def rejects(self, message: Any, text: str) -> bool:
+        """Не нужна ли сообщению коррекция"""
+
+    def __call__(self, message: Any, text: str) -> bool:
+        if self.rejects(message, text):
+            self.rejected += 1
+            return True
+        return False
+
+
+class CommandFilter(PreFilter):
+    """Команды ботам"""
+
+    name = "command"
+
+    def rejects(self, message: Any, text: str) -> bool:
+        return text.startswith("/")
+
+
+class EmojiOnlyFilter(PreFilter):
+    """Только эмодзи"""
+
+    name = "emoji_only"
+
+    def rejects(self, message: Any, text: str) -> bool:
+        return EMOJI_ONLY_RE.match(text) is not None
+
+
+class ForwardedOrMediaFilter(PreFilter):
+    """Пересланные сообщения и подписи к медиа"""
+
+    name = "forwarded_or_media"
+
+    def rejects(self, message: Any, text: str) -> bool:
+        if getattr(message, "fwd_from", None) is not None:
+            return True
+
+        media = getattr(message, "media", None)
+        return media is not None and not isinstance(media, MessageMediaWebPage)
+
+
+class LinksAndCodeFilter(PreFilter):
+    """Сообщения из одних ссылок, кода и упоминаний"""
+
+    name = "links_and_code"
+
+    def rejects(self, message: Any, text: str) -> bool:
+        stripped = CODE_RE.sub(" ", text)
+        stripped = URL_RE.sub(" ", stripped)
+        stripped = MENTION_RE.sub(" ", stripped)
+        return stripped != text and LETTER_RE.search(stripped) is None
+
+
+class NoLettersFilter(PreFilter):
+    """Числа, знаки и прочий текст без букв"""
+
+    name = "no_letters"
+
+    def rejects(self, message: Any, text: str) -> bool:
+        return LETTER_RE.search(text) is None
+
+
+class NonCyrillicFilter(PreFilter):
+    """Текст не на русском языке"""
+
+    name = "non_cyrillic"
+
+    def __init__(self, min_ratio: float = PREFILTER_MIN_CYRILLIC_RATIO):
+        super().__init__()
+        self.min_ratio = min_ratio
+
+    def rejects(self, message: Any, text: str) -> bool:
+        letters = LETTER_RE.findall(text)
+        if not letters:
+            return False
+
+        cyrillic = sum(1 for letter in letters if CYRILLIC_RE.match(letter))
+        return cyrillic / len(letters) < self.min_ratio
+
+
+class LooksCleanFilter(PreFilter):
+    """Текст без признаков ошибок по локальной проверке"""
+
+    name = "looks_clean"
+
+    def __init__(self, is_known_word: Optional[Callable[[str], bool]] = None):
+        super().__init__()
+        self.is_known_word = is_known_word
+
+    def rejects(self, message: Any, text: str) -> bool:
+        # Без словаря нельзя утверждать, что в тексте нет опечаток
+        if self.is_known_word is None:
+            return False
+
+        if SLOPPY_RE.search(text.strip()):
+            return False
+
+        return all(
+            self.is_known_word(word.lower()) for word in WORD_RE.findall(text)
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def load_word_set(path: str) -> Optional[FrozenSet[str]]:
+    """Загрузка словаря (одно слово в строке, через пробел может идти частота)"""
+    if not path:
+        return None
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            return frozenset(
+                line.split()[0].lower() for line in f if line.strip()
+            )
+    except OSError as e:
+        logger.error(f"Не удалось загрузить словарь {path}: {e}")
+        return None
+
+
+class PreFilterChain:
+    """Цепочка быстрых локальных фильтров перед обращением к БД и ИИ"""
+
+    def __init__(self, filters: Optional[List[PreFilter]] = None):
+        if filters is None:
+            filters = self.default_filters()
+        self.filters = filters
+        self.passed = 0
+
+    @staticmethod
+    def default_filters() -> List[PreFilter]:
+        index = get_spell_index()
+        words = load_word_set(SPELLCHECK_DICTIONARY) if index is None else None
+        if index is not None:
+            is_known_word = index.is_known
+        elif words is not None:
+            is_known_word = words.__contains__
+        else:
+            is_known_word = None
+
+        # Сначала самые дешевые проверки
+        return [
+            CommandFilter(),
+            ForwardedOrMediaFilter(),
+            EmojiOnlyFilter(),
+            NoLettersFilter(),
+            LinksAndCodeFilter(),
+            NonCyrillicFilter(),
+            LooksCleanFilter(is_known_word),
+        ]
+
+    def add(self, prefilter: PreFilter):
+        """Подключение дополнительного фильтра в конец цепочки"""
+        self.filters.append(prefilter)
+
+    def check(self, message: Any) -> Optional[str]:
+        """Имя отсекшего фильтра или None, если сообщение нужно обработать"""
+        text = message.text or ""
+
+        for prefilter in self.filters:
+            if prefilter(message, text):
+                return prefilter.name
+
+        self.passed += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики отсечений по фильтрам"""
+        counters = {prefilter.name: prefilter.rejected for prefilter in self.filters}
+        counters["passed"] = self.passed
+        return counters
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_QUEUE_MAX_SIZE = int(os.getenv("GEMINI_QUEUE_MAX_SIZE", "100"))
+GEMINI_QUEUE_DEADLINE = float(os.getenv("GEMINI_QUEUE_DEADLINE", "10"))
+GEMINI_USER_MAX_PENDING = int(os.getenv("GEMINI_USER_MAX_PENDING", "5"))
+
+
+class RateLimitTimeout(Exception):
+    """Запрос не удалось обслужить в пределах бюджета до дедлайна"""
+
+
+class TokenBucket:
+    """Корзина токенов с равномерным пополнением"""
+
+    def __init__(self, per_minute: float):
+        # per_minute <= 0 - без ограничений
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def try_take(self, amount: float) -> bool:
+        """Списание токенов, если их хватает"""
+        if self.unlimited:
+            return True
+
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def time_until(self, amount: float) -> float:
+        """Время до накопления нужного количества токенов"""
+        if self.unlimited:
+            return 0.0
+
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+
+class RateGovernor:
+    """Глобальный бюджет RPM/TPM с честной очередью между пользователями"""
+
+    def __init__(
+        self,
+        rpm: float = GEMINI_RPM,
+        tpm: float = GEMINI_TPM,
+        max_queue: int = GEMINI_QUEUE_MAX_SIZE,
+        deadline: float = GEMINI_QUEUE_DEADLINE,
+        user_max_pending: int = GEMINI_USER_MAX_PENDING,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.user_max_pending = user_max_pending
+
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+        # Очереди ожидания по пользователям, обслуживаются по кругу
+        self._queues: "OrderedDict[Any, Deque[Tuple[float, asyncio.Future]]]" = (
+            OrderedDict()
+        )
+        self._queued = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def make_deadline(self) -> float:
+        """Общий дедлайн сообщения для acquire() и acquire_request()"""
+        return time.monotonic() + self.deadline
+
+    async def acquire(
+        self, user_id: Any, tokens: float, deadline: Optional[float] = None
+    ) -> bool:
+        """Допуск сообщения пользователя к модели (False - пропустить)
+
+        deadline - момент time.monotonic(), до которого сообщение может ждать
+        (по умолчанию через self.deadline секунд).
+        """
+        if deadline is None:
+            deadline = self.make_deadline()
+        user_queue = self._queues.get(user_id)
+
+        if self._queued == 0 and self.tokens.try_take(tokens):
+            self.admitted += 1
+            return True
+
+        if self._queued >= self.max_queue or (
+            user_queue is not None and len(user_queue) >= self.user_max_pending
+        ):
+            self.rejected += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append((tokens, future))
+        self._queued += 1
+        self._ensure_dispatcher()
+        self._wakeup.set()
+
+        try:
+            await asyncio.wait_for(future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.expired += 1
+            return False
+
+        self.admitted += 1
+        return True
+
+    async def acquire_request(self, deadline: Optional[float] = None):
+        """Ожидание слота RPM для обращения к API (до того же дедлайна, что и acquire)"""
+        if deadline is None:
+            deadline = self.make_deadline()
+
+        while not self.requests.try_take(1):
+            delay = self.requests.time_until(1)
+            if time.monotonic() + delay > deadline:
+                self.expired += 1
+                raise RateLimitTimeout("Превышен лимит запросов к модели")
+            await asyncio.sleep(delay)
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _next_waiter(self) -> Optional[Tuple[Any, float, asyncio.Future]]:
+        """Следующий ожидающий по кругу пользователей (просроченные отбрасываются)"""
+        while self._queues:
+            user_id, user_queue = next(iter(self._queues.items()))
+
+            while user_queue and user_queue[0][1].done():
+                user_queue.popleft()
+                self._queued -= 1
+
+            if not user_queue:
+                del self._queues[user_id]
+                continue
+
+            tokens, future = user_queue[0]
+            return user_id, tokens, future
+
+        return None
+
+    async def _dispatch(self):
+        """Выдача бюджета ожидающим в порядке круговой очереди"""
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+
+            user_id, tokens, future = waiter
+            if not self.tokens.try_take(tokens):
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.tokens.time_until(tokens)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            user_queue = self._queues[user_id]
+            user_queue.popleft()
+            self._queued -= 1
+            future.set_result(True)
+
+            # Пользователь уходит в конец круга
+            self._queues.move_to_end(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики допуска"""
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "queued": self._queued,
+        }
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXECUTOR_KIND = os.getenv("TEXT_EXECUTOR_KIND", "thread")
+TEXT_EXECUTOR_WORKERS = int(os.getenv("TEXT_EXECUTOR_WORKERS", "2"))
+TEXT_OFFLOAD_THRESHOLD = int(os.getenv("TEXT_OFFLOAD_THRESHOLD", "1000"))
+
+
+class TextExecutor:
+    """Пул для CPU-тяжелой обработки текста вне цикла событий"""
+
+    def __init__(
+        self,
+        kind: str = TEXT_EXECUTOR_KIND,
+        max_workers: int = TEXT_EXECUTOR_WORKERS,
+        threshold: int = TEXT_OFFLOAD_THRESHOLD,
+    ):
+        # kind: thread или process; для process функция должна быть
+        # определена на уровне модуля, а аргументы - сериализуемы
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.threshold = threshold
+
+        self.inline_calls = 0
+        self.offloaded_calls = 0
+        self._pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        """Ленивое создание пула"""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="text"
+                )
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество задач в пуле (выполняемых и ожидающих)"""
+        return self._pending
+
+    async def run(self, func: Callable[..., Any], *args: Any, size: int = 0) -> Any:
+        """Выполнение функции: короткие входы - на месте, длинные - в пуле"""
+        if size < self.threshold:
+            self.inline_calls += 1
+            return func(*args)
+
+        self.offloaded_calls += 1
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        """Остановка пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики вызовов и глубина очереди"""
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "inline_calls": self.inline_calls,
+            "offloaded_calls": self.offloaded_calls,
+            "queue_depth": self.queue_depth,
+        }
+
+
+text_executor = TextExecutor()
@@ -1,6 +1,8 @@
 import os
 import asyncio
 import logging
+import random
+import time
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 from telethon.errors import (
@@ -9,27 +11,50 @@ from telethon.errors import (
     PhoneNumberInvalidError,
     FloodWaitError,
 )
-from typing import Optional, Dict, Any
-import re
+from typing import Optional, Dict, Any, Callable, Set
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
 from bot.services.ai_service import AIService
-from bot.database.database import UserSettingsDatabase
+from bot.database.database import UserSettingsDatabase, UserBotDatabase
+from bot.database.telethon_session import DatabaseSession
+from bot.utils.edit_registry import RecentEditsRegistry
+from bot.services.prefilter import PreFilterChain
+from bot.services.client_supervisor import ClientSupervisor, SessionRevokedError
+from bot.services.edit_debouncer import MessageDebouncer
+from bot.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+CORRECTION_STAGE_SECONDS = metrics.histogram(
+    "correction_stage_seconds", "Длительность этапов коррекции сообщения", ("stage",)
+)
+CORRECTION_OUTCOMES = metrics.counter(
+    "correction_outcomes_total", "Итоги обработки исходящих сообщений", ("outcome",)
+)
+
+USERBOT_RESTORE_CONCURRENCY = int(os.getenv("USERBOT_RESTORE_CONCURRENCY", "20"))
+USERBOT_RESTORE_RETRIES = int(os.getenv("USERBOT_RESTORE_RETRIES", "3"))
+USERBOT_RESTORE_BACKOFF = float(os.getenv("USERBOT_RESTORE_BACKOFF", "2"))
+USERBOT_RESTORE_JITTER = float(os.getenv("USERBOT_RESTORE_JITTER", "1"))
+
 
 class UserBotService:
     """Сервис для управления user-ботами"""
 
-    def __init__(self):
+    def __init__(self, ai_service: Optional[AIService] = None):
         self.api_id = os.getenv("API_ID")
         self.api_hash = os.getenv("API_HASH")
         self.active_bots: Dict[int, TelegramClient] = {}
-        self.ai_service = AIService()
+        self.recent_edits: Dict[int, RecentEditsRegistry] = {}
+        self.ai_service = ai_service or AIService()
+        self.prefilter = PreFilterChain()
+        self.supervisor = ClientSupervisor(self)
+        self.edit_debouncer = MessageDebouncer()
+        # Подключения, запущенные restore_active_bots (отменяются при остановке)
+        self._restore_tasks: Set[asyncio.Task] = set()
 
     async def create_session(self, phone_number: str) -> Dict[str, Any]:
         """Создание новой сессии user-бота"""
@@ -39,12 +64,13 @@ class UserBotService:
 
             await client.connect()
 
-            await client.send_code_request(phone_number)
+            sent_code = await client.send_code_request(phone_number)
 
             return {
                 "success": True,
                 "client": client,
                 "phone_number": phone_number,
+                "phone_code_hash": sent_code.phone_code_hash,
                 "message": "Код отправлен на указанный номер",
             }
 
@@ -59,12 +85,22 @@ class UserBotService:
             logger.error(f"Ошибка создания сессии: {e}")
             return {"success": False, "message": f"Ошибка: {str(e)}"}
 
+    async def resume_session(self, session_string: str) -> TelegramClient:
+        """Клиент незавершенного входа, начатого в другом процессе"""
+        client = TelegramClient(StringSession(session_string), self.api_id, self.api_hash)
+        await client.connect()
+        return client
+
     async def verify_code(
-        self, client: TelegramClient, phone_number: str, code: str
+        self,
+        client: TelegramClient,
+        phone_number: str,
+        code: str,
+        phone_code_hash: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Проверка кода подтверждения"""
         try:
-            await client.sign_in(phone_number, code)
+            await client.sign_in(phone_number, code, phone_code_hash=phone_code_hash)
 
             session_string = client.session.save()
 
@@ -108,34 +144,165 @@ class UserBotService:
     async def start_user_bot(self, user_id: int, session_string: str) -> bool:
         """Запуск user-бота"""
         try:
+            await self._start_user_bot(user_id, session_string)
+            return True
 
-            if user_id in self.active_bots:
-                await self.stop_user_bot(user_id)
+        except Exception as e:
+            logger.error(f"Ошибка запуска user-бота: {e}")
+            return False
+
+    async def _start_user_bot(self, user_id: int, session_string: str):
+        """Подключение клиента и регистрация обработчиков (ошибки пробрасываются)"""
+        if user_id in self.active_bots:
+            await self.stop_user_bot(user_id)
 
-            client = TelegramClient(
-                StringSession(session_string), self.api_id, self.api_hash
-            )
+        # Кеш сущностей и состояние обновлений переживают рестарт
+        session = await DatabaseSession.load(user_id, session_string)
+        client = TelegramClient(session, self.api_id, self.api_hash)
 
+        # Прерванное подключение (ошибка или отмена) не должно оставлять клиента
+        try:
             await client.connect()
 
+            if not await client.is_user_authorized():
+                raise SessionRevokedError(
+                    f"Сессия пользователя {user_id} недействительна"
+                )
+
             await self._setup_handlers(client, user_id)
+        except BaseException:
+            await client.disconnect()
+            raise
 
-            self.active_bots[user_id] = client
+        self.active_bots[user_id] = client
+        self.supervisor.watch(user_id, client)
+        await UserBotDatabase.update_last_activity(user_id)
 
-            logger.info(f"User-бот для пользователя {user_id} запущен")
-            return True
+        logger.info(f"User-бот для пользователя {user_id} запущен")
 
-        except Exception as e:
-            logger.error(f"Ошибка запуска user-бота: {e}")
-            return False
+    async def restore_active_bots(
+        self, user_filter: Optional[Callable[[int], bool]] = None
+    ) -> Dict[str, Any]:
+        """Запуск всех активных user-ботов после рестарта"""
+        semaphore = asyncio.Semaphore(USERBOT_RESTORE_CONCURRENCY)
+        tasks = []
+        restored = 0
+        failed = 0
+        connect_time = 0.0
+
+        async def restore(user_id: int, session_string: str):
+            nonlocal restored, failed, connect_time
+            try:
+                started_at = time.monotonic()
+                if await self._restore_user_bot(user_id, session_string):
+                    restored += 1
+                else:
+                    failed += 1
+                connect_time += time.monotonic() - started_at
+            finally:
+                semaphore.release()
+
+        total_started_at = time.monotonic()
+        load_time = 0.0
+        load_started_at = time.monotonic()
+
+        def should_restore(user_id: int) -> bool:
+            if user_id in self.active_bots:
+                return False
+            return user_filter is None or user_filter(user_id)
+
+        async for bot_data in UserBotDatabase.iter_active_user_bots(
+            user_filter=should_restore
+        ):
+            load_time += time.monotonic() - load_started_at
+
+            user_id = bot_data["user_id"]
+            session_string = bot_data.get("session_string")
+
+            if session_string and user_id not in self.active_bots:
+                await semaphore.acquire()
+                task = asyncio.create_task(restore(user_id, session_string))
+                self._restore_tasks.add(task)
+                task.add_done_callback(self._restore_tasks.discard)
+                tasks.append(task)
+
+            load_started_at = time.monotonic()
+
+        load_time += time.monotonic() - load_started_at
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            await self._cancel_restore_tasks()
+            raise
+
+        report = {
+            "restored": restored,
+            "failed": failed,
+            "load_seconds": round(load_time, 3),
+            "connect_seconds": round(connect_time, 3),
+            "total_seconds": round(time.monotonic() - total_started_at, 3),
+        }
+        logger.info(
+            f"Восстановлено user-ботов: {restored}, ошибок: {failed} "
+            f"(загрузка {report['load_seconds']} с, подключение {report['connect_seconds']} с, "
+            f"всего {report['total_seconds']} с)"
+        )
+        return report
+
+    async def _restore_user_bot(self, user_id: int, session_string: str) -> bool:
+        """Подключение одного user-бота с повторами и случайной задержкой"""
+        # Разносим подключения во времени, чтобы не упираться в flood-лимиты
+        await asyncio.sleep(random.uniform(0, USERBOT_RESTORE_JITTER))
+
+        for attempt in range(1, USERBOT_RESTORE_RETRIES + 1):
+            try:
+                await self._start_user_bot(user_id, session_string)
+                return True
+            except SessionRevokedError as e:
+                logger.error(f"{e}, пропускаем")
+                return False
+            except FloodWaitError as e:
+                delay = e.seconds + random.uniform(0, USERBOT_RESTORE_JITTER)
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось восстановить user-бота {user_id} (попытка {attempt}): {e}"
+                )
+                delay = USERBOT_RESTORE_BACKOFF * 2 ** (attempt - 1)
+                delay += random.uniform(0, delay)
+
+            if attempt < USERBOT_RESTORE_RETRIES:
+                await asyncio.sleep(delay)
+
+        logger.error(f"User-бот пользователя {user_id} не восстановлен")
+        return False
+
+    async def _cancel_restore_tasks(self):
+        """Отмена еще идущих подключений restore_active_bots"""
+        tasks = list(self._restore_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stop_all_user_bots(self):
+        """Остановка всех user-ботов"""
+        # Иначе подключение, завершившееся после остановки, оставит живой клиент
+        await self._cancel_restore_tasks()
+        await asyncio.gather(
+            *(self.stop_user_bot(user_id) for user_id in list(self.active_bots))
+        )
+        self.supervisor.shutdown()
 
     async def stop_user_bot(self, user_id: int) -> bool:
         """Остановка user-бота"""
         try:
             if user_id in self.active_bots:
                 client = self.active_bots[user_id]
+                self.supervisor.unwatch(user_id)
+                self.edit_debouncer.cancel_user(user_id)
                 await client.disconnect()
+                await client.session.flush()
                 del self.active_bots[user_id]
+                self.recent_edits.pop(user_id, None)
                 logger.info(f"User-бот для пользователя {user_id} остановлен")
                 return True
             return False
@@ -147,54 +314,100 @@ class UserBotService:
         """Проверка, активен ли user-бот"""
         return user_id in self.active_bots
 
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики сервиса и его компонентов"""
+        return {
+            "active_clients": len(self.active_bots),
+            "supervisor": self.supervisor.stats(),
+            "debouncer": self.edit_debouncer.stats(),
+            "prefilter": self.prefilter.stats(),
+            "ai": self.ai_service.stats(),
+        }
+
     async def _setup_handlers(self, client: TelegramClient, user_id: int):
         """Настройка обработчиков событий для user-бота"""
 
-        @client.on(events.MessageEdited(outgoing=True))
-        @client.on(events.NewMessage(outgoing=True))
-        async def auto_correct_handler(event):
+        recent_edits = self.recent_edits.setdefault(user_id, RecentEditsRegistry())
+
+        async def correct_message(message, chat_id):
+            with CORRECTION_STAGE_SECONDS.time(stage="total"):
+                outcome = await process_message(message, chat_id)
+            CORRECTION_OUTCOMES.inc(outcome=outcome)
+
+        async def process_message(message, chat_id) -> str:
             try:
 
-                settings = await UserSettingsDatabase.get_settings(user_id)
+                with CORRECTION_STAGE_SECONDS.time(stage="settings"):
+                    settings = await UserSettingsDatabase.get_settings(user_id)
 
                 if not settings.get("auto_correct_enabled", True):
-                    return
-
-                message = event.message
+                    return "filtered"
 
                 if len(message.text) < settings.get("min_message_length", 10):
-                    return
-
-                if message.text.startswith("/"):
-                    return
-
-                if re.match(
-                    r"^[\s\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002702-\U000027B0\U000024C2-\U0001F251]+$",
-                    message.text,
-                ):
-                    return
+                    return "filtered"
 
                 logger.info(f"Обрабатываем сообщение пользователя {user_id}")
 
                 original_text = message.text
 
-                processed_text = await self.ai_service.correct_text(original_text)
+                with CORRECTION_STAGE_SECONDS.time(stage="correct_text"):
+                    processed_text = await self.ai_service.correct_text(
+                        original_text, user_id
+                    )
                 action_type = "correction"
 
-                if self.ai_service.has_significant_changes(
-                    original_text, processed_text
-                ):
+                with CORRECTION_STAGE_SECONDS.time(stage="significance"):
+                    significant = await self.ai_service.has_significant_changes_async(
+                        original_text, processed_text
+                    )
+
+                if significant:
                     logger.info(f"Сообщение пользователя {user_id} исправлено")
 
-                    await message.edit(processed_text)
+                    recent_edits.remember(chat_id, message.id, processed_text)
+                    with CORRECTION_STAGE_SECONDS.time(stage="edit"):
+                        await message.edit(processed_text)
 
                     logger.info("✅ Сообщение обработано!")
+                    return "corrected"
                 else:
                     logger.info("✅ Изменений не требуется")
+                    return "unchanged"
 
             except Exception as e:
                 logger.error(
                     f"❌ Ошибка при обработке сообщения пользователя {user_id}: {e}"
                 )
+                return "error"
+
+        @client.on(events.MessageEdited(outgoing=True))
+        @client.on(events.NewMessage(outgoing=True))
+        async def auto_correct_handler(event):
+            try:
+
+                if recent_edits.is_own_edit(
+                    event.chat_id, event.message.id, event.message.text
+                ):
+                    return
+
+                message = event.message
+                key = (user_id, event.chat_id, message.id)
+
+                # Более новое содержимое отменяет коррекцию предыдущего
+                if self.prefilter.check(message) is not None:
+                    self.edit_debouncer.cancel(key)
+                    CORRECTION_OUTCOMES.inc(outcome="filtered")
+                    return
+
+                # Новое сообщение обрабатываем сразу, правки - после паузы
+                is_edit = isinstance(event, events.MessageEdited.Event)
+                self.edit_debouncer.submit(
+                    key,
+                    lambda: correct_message(message, event.chat_id),
+                    delay=None if is_edit else 0,
+                )
 
-        asyncio.create_task(client.run_until_disconnected())
+            except Exception as e:
+                logger.error(
+                    f"❌ Ошибка при обработке сообщения пользователя {user_id}: {e}"
+                )
@@ -0,0 +1,453 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+USERBOT_WORKERS = int(os.getenv("USERBOT_WORKERS", "0"))
+USERBOT_WORKER_SOCKET_DIR = os.getenv("USERBOT_WORKER_SOCKET_DIR", "")
+USERBOT_WORKER_TIMEOUT = float(os.getenv("USERBOT_WORKER_TIMEOUT", "60"))
+
+PROJECT_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# Бюджет запросов к Gemini делится между процессами
+SHARED_BUDGET_VARIABLES = {"GEMINI_RPM": "60", "GEMINI_TPM": "1000000"}
+
+
+def shard_for_user(user_id: int, shard_count: int) -> int:
+    """Номер процесса для пользователя (jump consistent hash)
+
+    При изменении числа процессов переезжает минимум пользователей.
+    """
+    key = user_id & 0xFFFFFFFFFFFFFFFF
+    bucket, j = -1, 0
+    while j < shard_count:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+async def _write_message(
+    writer: asyncio.StreamWriter, lock: asyncio.Lock, message: Dict[str, Any]
+):
+    """Отправка одного JSON-сообщения (по строке на сообщение)"""
+    async with lock:
+        writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+
+
+def run_worker(shard_id: int, shard_count: int, socket_path: str):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - worker-{shard_id} - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(_worker_main(shard_id, shard_count, socket_path))
+
+
+async def _worker_main(shard_id: int, shard_count: int, socket_path: str):
+    """Цикл воркера: свой набор клиентов и команды от основного процесса"""
+    # Сервисы user-ботов нужны только воркеру, не основному процессу при импорте
+    from bot.database.database import init_db, close_db
+    from bot.database.settings_cache import settings_cache
+    from bot.services.text_executor import text_executor
+    from bot.services.userbot_service import UserBotService
+
+    from bot.utils.encryption import session_crypto
+    from bot.utils.metrics import METRICS_PORT, metrics, start_metrics_server
+
+    await init_db()
+    try:
+        await asyncio.to_thread(session_crypto.warm_up)
+    except Exception as e:
+        logger.warning(f"Ключ шифрования не подготовлен: {e}")
+    service = UserBotService()
+    disconnected = asyncio.Event()
+
+    # Каждый воркер отдает свои метрики на следующем за основным порту
+    metrics.add_collector("userbot", service.stats)
+    metrics_runner = await start_metrics_server(
+        port=METRICS_PORT + shard_id + 1 if METRICS_PORT > 0 else 0
+    )
+
+    async def execute(command: Dict[str, Any]) -> Any:
+        name = command["cmd"]
+        user_id = command.get("user_id")
+
+        if name == "start":
+            return await service.start_user_bot(user_id, command["session_string"])
+        if name == "stop":
+            return await service.stop_user_bot(user_id)
+        if name == "status":
+            return service.is_bot_active(user_id)
+        if name == "list":
+            return list(service.active_bots)
+        if name == "restore":
+            return await service.restore_active_bots(
+                lambda uid: shard_for_user(uid, shard_count) == shard_id
+            )
+        if name == "invalidate_settings":
+            settings_cache.invalidate(user_id)
+            return True
+        raise ValueError(f"Неизвестная команда: {name}")
+
+    async def handle_connection(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        lock = asyncio.Lock()
+
+        async def respond(command: Dict[str, Any]):
+            try:
+                result = await execute(command)
+                message = {"id": command["id"], "ok": True, "result": result}
+            except Exception as e:
+                logger.error(f"Ошибка выполнения команды {command.get('cmd')}: {e}")
+                message = {"id": command["id"], "ok": False, "error": str(e)}
+            try:
+                await _write_message(writer, lock, message)
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                asyncio.create_task(respond(json.loads(line)))
+        finally:
+            # Основной процесс закрыл соединение - воркер завершается
+            disconnected.set()
+
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    logger.info(f"Воркер {shard_id}/{shard_count} запущен")
+
+    try:
+        await disconnected.wait()
+    finally:
+        server.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await service.stop_all_user_bots()
+        await close_db()
+        text_executor.shutdown()
+        logger.info(f"Воркер {shard_id}/{shard_count} остановлен")
+
+
+class UserBotWorker:
+    """Процесс-воркер со стороны основного процесса"""
+
+    def __init__(self, shard_id: int, shard_count: int, socket_dir: str, on_exit):
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.socket_path = os.path.join(socket_dir, f"userbot-{shard_id}.sock")
+        self.on_exit = on_exit
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._write_lock = asyncio.Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._read_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self):
+        """Запуск процесса и подключение к его сокету"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        env = os.environ.copy()
+        for name, default in SHARED_BUDGET_VARIABLES.items():
+            total = float(os.getenv(name, default))
+            env[name] = str(total / self.shard_count)
+
+        # Отдельный интерпретатор, а не fork: у воркера свой чистый цикл событий
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            __name__,
+            str(self.shard_id),
+            str(self.shard_count),
+            self.socket_path,
+            cwd=PROJECT_ROOT,
+            env=env,
+        )
+
+        deadline = asyncio.get_running_loop().time() + USERBOT_WORKER_TIMEOUT
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    self.socket_path
+                )
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if self.process.returncode is not None:
+                    raise RuntimeError(f"Воркер {self.shard_id} завершился при запуске")
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"Воркер {self.shard_id} не отвечает")
+                await asyncio.sleep(0.1)
+
+        self._stopping = False
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        """Разбор ответов воркера"""
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if message.get("ok"):
+                    future.set_result(message.get("result"))
+                else:
+                    future.set_exception(RuntimeError(message.get("error")))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Воркер недоступен"))
+            self._pending.clear()
+            if self._writer is not None:
+                self._writer.close()
+
+            if not self._stopping:
+                logger.error(f"Воркер {self.shard_id} неожиданно завершился")
+                asyncio.create_task(self.on_exit(self))
+
+    async def request(
+        self, cmd: str, timeout: Optional[float] = USERBOT_WORKER_TIMEOUT, **kwargs
+    ) -> Any:
+        """Команда воркеру и ожидание ответа"""
+        if not self.is_running:
+            raise ConnectionError(f"Воркер {self.shard_id} не запущен")
+
+        self._next_id += 1
+        command_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = future
+
+        try:
+            await _write_message(
+                self._writer, self._write_lock, {"id": command_id, "cmd": cmd, **kwargs}
+            )
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(command_id, None)
+
+    async def stop(self):
+        """Остановка процесса (воркер завершается при закрытии соединения)"""
+        self._stopping = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+
+        if self.process is not None and self.process.returncode is None:
+            try:
+                await asyncio.wait_for(self.process.wait(), USERBOT_WORKER_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.process.terminate()
+                await self.process.wait()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class ShardedUserBotService:
+    """Сервис user-ботов, распределенный по процессам-воркерам
+
+    Повторяет интерфейс UserBotService, которым пользуются хендлеры.
+    """
+
+    def __init__(self, worker_count: int = USERBOT_WORKERS):
+        from bot.database.settings_cache import settings_cache
+        from bot.services.userbot_service import UserBotService
+
+        self.worker_count = worker_count
+        # Вход в аккаунт идет в основном процессе, клиенты живут в воркерах
+        self.login_service = UserBotService()
+        self.socket_dir = USERBOT_WORKER_SOCKET_DIR or tempfile.mkdtemp(
+            prefix="userbot-workers-"
+        )
+        os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+
+        self.workers: List[UserBotWorker] = [
+            UserBotWorker(shard_id, worker_count, self.socket_dir, self._on_worker_exit)
+            for shard_id in range(worker_count)
+        ]
+        self._active: Set[int] = set()
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        settings_cache.add_invalidation_listener(self._forward_invalidation)
+
+    async def start(self):
+        """Запуск всех воркеров (повторный вызов ничего не делает)"""
+        async with self._start_lock:
+            if self._started:
+                return
+            await asyncio.gather(*(worker.start() for worker in self.workers))
+            self._started = True
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"Запущено воркеров user-ботов: {self.worker_count}")
+
+    def _worker_for(self, user_id: int) -> UserBotWorker:
+        return self.workers[shard_for_user(user_id, self.worker_count)]
+
+    async def _on_worker_exit(self, worker: UserBotWorker):
+        """Перезапуск упавшего воркера и восстановление его пользователей"""
+        self._active = {
+            user_id for user_id in self._active if self._worker_for(user_id) is not worker
+        }
+        try:
+            await worker.start()
+            await self._restore_worker(worker)
+        except Exception as e:
+            logger.error(f"Не удалось перезапустить воркер {worker.shard_id}: {e}")
+
+    def _forward_invalidation(self, user_id: int):
+        """Сброс кеша настроек в воркере, который обслуживает пользователя"""
+        worker = self._worker_for(user_id)
+        if worker.is_running:
+            asyncio.create_task(self._send_invalidation(worker, user_id))
+
+    async def _send_invalidation(self, worker: UserBotWorker, user_id: int):
+        try:
+            await worker.request("invalidate_settings", user_id=user_id)
+        except Exception as e:
+            logger.error(f"Ошибка сброса настроек в воркере {worker.shard_id}: {e}")
+
+    async def create_session(self, phone_number: str) -> Dict[str, Any]:
+        return await self.login_service.create_session(phone_number)
+
+    async def resume_session(self, session_string: str):
+        return await self.login_service.resume_session(session_string)
+
+    async def verify_code(
+        self, client, phone_number: str, code: str, phone_code_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return await self.login_service.verify_code(
+            client, phone_number, code, phone_code_hash
+        )
+
+    async def verify_password(self, client, password: str) -> Dict[str, Any]:
+        return await self.login_service.verify_password(client, password)
+
+    async def start_user_bot(self, user_id: int, session_string: str) -> bool:
+        """Запуск user-бота в его воркере"""
+        try:
+            await self.start()
+            success = await self._worker_for(user_id).request(
+                "start", user_id=user_id, session_string=session_string
+            )
+        except Exception as e:
+            logger.error(f"Ошибка запуска user-бота: {e}")
+            return False
+
+        if success:
+            self._active.add(user_id)
+        return bool(success)
+
+    async def stop_user_bot(self, user_id: int) -> bool:
+        """Остановка user-бота в его воркере"""
+        try:
+            await self.start()
+            success = await self._worker_for(user_id).request("stop", user_id=user_id)
+        except Exception as e:
+            logger.error(f"Ошибка остановки user-бота: {e}")
+            return False
+
+        self._active.discard(user_id)
+        return bool(success)
+
+    def is_bot_active(self, user_id: int) -> bool:
+        """Проверка, активен ли user-бот (по зеркалу состояния воркеров)"""
+        return user_id in self._active
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики основного процесса (подробные метрики отдают сами воркеры)"""
+        return {
+            "active_clients": len(self._active),
+            "workers_running": sum(1 for worker in self.workers if worker.is_running),
+        }
+
+    async def refresh_status(self):
+        """Синхронизация зеркала активных user-ботов с воркерами"""
+        active: Set[int] = set()
+        for worker in self.workers:
+            try:
+                active.update(await worker.request("list"))
+            except Exception as e:
+                logger.error(f"Ошибка получения статуса воркера {worker.shard_id}: {e}")
+        self._active = active
+
+    async def _refresh_loop(self):
+        """Воркеры сами удаляют мертвых клиентов - периодически сверяем зеркало"""
+        from bot.services.client_supervisor import USERBOT_PROBE_INTERVAL
+
+        while True:
+            await asyncio.sleep(USERBOT_PROBE_INTERVAL)
+            await self.refresh_status()
+
+    async def _restore_worker(self, worker: UserBotWorker) -> Dict[str, Any]:
+        report = await worker.request("restore", timeout=None)
+        self._active.update(await worker.request("list"))
+        return report
+
+    async def restore_active_bots(self) -> Dict[str, Any]:
+        """Параллельное восстановление user-ботов во всех воркерах"""
+        await self.start()
+        reports = await asyncio.gather(
+            *(self._restore_worker(worker) for worker in self.workers),
+            return_exceptions=True,
+        )
+
+        summary = {"restored": 0, "failed": 0, "total_seconds": 0.0}
+        for worker, report in zip(self.workers, reports):
+            if isinstance(report, Exception):
+                logger.error(f"Ошибка восстановления в воркере {worker.shard_id}: {report}")
+                continue
+            summary["restored"] += report["restored"]
+            summary["failed"] += report["failed"]
+            summary["total_seconds"] = max(
+                summary["total_seconds"], report["total_seconds"]
+            )
+        return summary
+
+    async def stop_all_user_bots(self):
+        """Остановка всех воркеров вместе с их клиентами"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        self._active.clear()
+        self._started = False
+
+
+def create_userbot_service():
+    """UserBotService в текущем процессе или его шардированный вариант"""
+    if USERBOT_WORKERS > 0:
+        return ShardedUserBotService(USERBOT_WORKERS)
+
+    from bot.services.userbot_service import UserBotService
+
+    return UserBotService()
+
+
+if __name__ == "__main__":
+    run_worker(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3])
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+RECENT_EDITS_TTL = float(os.getenv("RECENT_EDITS_TTL", "30"))
+RECENT_EDITS_MAX_SIZE = int(os.getenv("RECENT_EDITS_MAX_SIZE", "1000"))
+
+
+class RecentEditsRegistry:
+    """Реестр сообщений, недавно отредактированных самим user-ботом"""
+
+    def __init__(
+        self, ttl: float = RECENT_EDITS_TTL, max_size: int = RECENT_EDITS_MAX_SIZE
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[Optional[int], int], Tuple[str, float]]" = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        """Хеш содержимого сообщения"""
+        return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+    def _purge_expired(self, now: float):
+        """Удаление просроченных записей (самые старые идут первыми)"""
+        while self._entries:
+            key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def remember(self, chat_id: Optional[int], message_id: int, text: str):
+        """Запоминаем текст, который мы только что записали в сообщение"""
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        key = (chat_id, message_id)
+        self._entries.pop(key, None)
+        self._entries[key] = (self._hash_text(text), now + self.ttl)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def is_own_edit(self, chat_id: Optional[int], message_id: int, text: str) -> bool:
+        """Проверка, что событие вызвано нашей собственной правкой"""
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        entry = self._entries.get((chat_id, message_id))
+        if not entry:
+            return False
+
+        return entry[0] == self._hash_text(text)
+
+    def clear(self):
+        """Очистка реестра"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,6 +1,9 @@
 import os
 import base64
-from cryptography.fernet import Fernet
+import threading
+import time
+from typing import Dict, List, Tuple
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import logging
@@ -11,37 +14,71 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Время жизни дешифрованных сессий в памяти (0 - без кеша)
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "300"))
+SESSION_CACHE_MAX_SIZE = int(os.getenv("SESSION_CACHE_MAX_SIZE", "1000"))
+
+
+def derive_fernet(encryption_key: str) -> Fernet:
+    """Создание ключа Fernet из строки"""
+    # Используем PBKDF2 для создания 32-байтного ключа
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b'telegram_session_salt',  # Фиксированная соль
+        iterations=100000,
+    )
+    key = base64.urlsafe_b64encode(kdf.derive(encryption_key.encode()))
+    return Fernet(key)
+
+
+def previous_encryption_keys() -> List[str]:
+    """Прежние ключи из ENCRYPTION_KEYS_PREVIOUS (через запятую) на время ротации"""
+    return [
+        key.strip()
+        for key in os.getenv('ENCRYPTION_KEYS_PREVIOUS', '').split(',')
+        if key.strip()
+    ]
+
+
 class SessionEncryption:
     """Класс для шифрования и дешифрования сессий"""
     
     def __init__(self):
         self._fernet = None
         self._initialized = False
+        self._init_lock = threading.Lock()
+        # Ключ кеша - зашифрованная строка, поэтому смена сессии его не задевает
+        self._decrypted_cache: Dict[str, Tuple[str, float]] = {}
     
     def _ensure_initialized(self):
         """Ленивая инициализация - загружаем ключ только при первом использовании"""
         if self._initialized:
             return
+
+        with self._init_lock:
+            if self._initialized:
+                return
+
+            encryption_key = os.getenv('ENCRYPTION_KEY')
+            if not encryption_key:
+                raise ValueError("ENCRYPTION_KEY не найден в переменных окружения!")
             
-        encryption_key = os.getenv('ENCRYPTION_KEY')
-        if not encryption_key:
-            raise ValueError("ENCRYPTION_KEY не найден в переменных окружения!")
-        
-        # Создаем ключ для Fernet из нашего секретного ключа
-        self._fernet = self._create_fernet_key(encryption_key)
-        self._initialized = True
+            # Шифруем текущим ключом, дешифруем любым из связки
+            keyring = [self._create_fernet_key(encryption_key)]
+            keyring.extend(
+                self._create_fernet_key(key) for key in previous_encryption_keys()
+            )
+            self._fernet = MultiFernet(keyring)
+            self._initialized = True
+
+    def warm_up(self):
+        """Заранее выводим ключ (PBKDF2 - дорогая операция, вызывать вне цикла событий)"""
+        self._ensure_initialized()
     
     def _create_fernet_key(self, encryption_key: str) -> Fernet:
         """Создание ключа Fernet из строки"""
-        # Используем PBKDF2 для создания 32-байтного ключа
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'telegram_session_salt',  # Фиксированная соль
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(encryption_key.encode()))
-        return Fernet(key)
+        return derive_fernet(encryption_key)
     
     def encrypt_session(self, session_string: str) -> str:
         """Шифрование строки сессии"""
@@ -59,23 +96,52 @@ class SessionEncryption:
             logger.error(f"Ошибка шифрования сессии: {e}")
             raise
     
-    def decrypt_session(self, encrypted_session: str) -> str:
+    def decrypt_session(self, encrypted_session: str, cache: bool = True) -> str:
         """Дешифрование строки сессии"""
         try:
             self._ensure_initialized()
             
             if not encrypted_session:
                 return ""
+
+            cached = self._decrypted_cache.get(encrypted_session) if cache else None
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
             
             # Декодируем из base64
             encrypted_data = base64.b64decode(encrypted_session.encode('utf-8'))
             # Дешифруем
             decrypted_data = self._fernet.decrypt(encrypted_data)
-            return decrypted_data.decode('utf-8')
+            session_string = decrypted_data.decode('utf-8')
+
+            if cache:
+                self._remember_decrypted(encrypted_session, session_string)
+            return session_string
             
         except Exception as e:
             logger.error(f"Ошибка дешифрования сессии: {e}")
             raise
 
+    def _remember_decrypted(self, encrypted_session: str, session_string: str):
+        """Кеширование дешифрованной сессии на короткое время"""
+        if SESSION_CACHE_TTL <= 0:
+            return
+
+        now = time.monotonic()
+        if len(self._decrypted_cache) >= SESSION_CACHE_MAX_SIZE:
+            self._decrypted_cache = {
+                key: entry
+                for key, entry in self._decrypted_cache.items()
+                if entry[1] > now
+            }
+            if len(self._decrypted_cache) >= SESSION_CACHE_MAX_SIZE:
+                self._decrypted_cache.pop(next(iter(self._decrypted_cache)))
+
+        self._decrypted_cache[encrypted_session] = (session_string, now + SESSION_CACHE_TTL)
+
+    def clear_cache(self):
+        """Очистка кеша дешифрованных сессий"""
+        self._decrypted_cache.clear()
+
 # Глобальный экземпляр для использования в других модулях
 session_crypto = SessionEncryption()
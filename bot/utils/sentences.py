@@ -0,0 +1,42 @@
+import re
+from typing import List, Tuple
+
+
+# Конец предложения: знаки препинания (с закрывающими кавычками) или перевод строки
+SENTENCE_END_RE = re.compile(r"[.!?…]+[\"»)]*(?=\s|$)|\n")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Границы предложений (начало, конец) без пробелов по краям
+
+    Текст между предложениями (пробелы, переводы строк) в границы не входит,
+    поэтому после замены предложений форматирование сообщения сохраняется.
+    """
+    spans = []
+    start = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        _append_span(spans, text, start, match.end())
+        start = match.end()
+    _append_span(spans, text, start, len(text))
+    return spans
+
+
+def _append_span(spans: List[Tuple[int, int]], text: str, start: int, end: int):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        spans.append((start, end))
+
+
+def splice(text: str, replacements: List[Tuple[int, int, str]]) -> str:
+    """Замена участков текста (начало, конец, новый текст); участки не пересекаются"""
+    parts = []
+    position = 0
+    for start, end, replacement in sorted(replacements):
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
@@ -0,0 +1,236 @@
+import functools
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bot.utils.text_distance import bounded_levenshtein_distance
+
+
+logger = logging.getLogger(__name__)
+
+SPELL_INDEX_PATH = os.getenv("SPELL_INDEX_PATH", "")
+
+MAGIC = b"SYMSPL01"
+# magic, max_distance, prefix_length, word_count, slot_count,
+# смещения: блок слов, таблица слов, слоты, списки id
+HEADER = struct.Struct("<8sIIIIQQQQ")
+WORD = struct.Struct("<III")  # смещение в блоке, длина в байтах, частота
+SLOT = struct.Struct("<III")  # crc32 ключа, начало списка id, длина списка
+WORD_ID = struct.Struct("<I")
+
+
+def _key_hash(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8"))
+
+
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """Все строки, получаемые удалением не более max_distance символов"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:i] + candidate[i + 1 :]
+            for candidate in frontier
+            for i in range(len(candidate))
+        }
+        result |= frontier
+    return result
+
+
+def read_frequency_dictionary(path: str) -> Dict[str, int]:
+    """Словарь частот: слово и (необязательно) частота через пробел"""
+    words: Dict[str, int] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            word = parts[0].lower()
+            frequency = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+            words[word] = words.get(word, 0) + frequency
+    return words
+
+
+def build_index(
+    words: Dict[str, int], path: str, max_distance: int = 1, prefix_length: int = 7
+) -> int:
+    """Построение файла индекса удалений (SymSpell), возвращает число ключей"""
+    ordered = sorted(words.items(), key=lambda item: (-item[1], item[0]))
+
+    postings: Dict[int, List[int]] = {}
+    for word_id, (word, _) in enumerate(ordered):
+        keys = deletes(word[:prefix_length], max_distance)
+        # Полное слово - ключ для проверки "слово известно"
+        keys.add(word)
+        for key in keys:
+            postings.setdefault(_key_hash(key), []).append(word_id)
+
+    slot_count = 1
+    while slot_count < len(postings) * 2:
+        slot_count *= 2
+    mask = slot_count - 1
+
+    slots = [(0, 0, 0)] * slot_count
+    id_list: List[int] = []
+    for key_hash, word_ids in postings.items():
+        position = key_hash & mask
+        while slots[position][2]:
+            position = (position + 1) & mask
+        slots[position] = (key_hash, len(id_list), len(word_ids))
+        id_list.extend(word_ids)
+
+    blob = bytearray()
+    word_table = bytearray()
+    for word, frequency in ordered:
+        encoded = word.encode("utf-8")
+        word_table += WORD.pack(len(blob), len(encoded), min(frequency, 0xFFFFFFFF))
+        blob += encoded
+
+    words_offset = HEADER.size
+    word_table_offset = words_offset + len(blob)
+    slots_offset = word_table_offset + len(word_table)
+    postings_offset = slots_offset + slot_count * SLOT.size
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                max_distance,
+                prefix_length,
+                len(ordered),
+                slot_count,
+                words_offset,
+                word_table_offset,
+                slots_offset,
+                postings_offset,
+            )
+        )
+        f.write(blob)
+        f.write(word_table)
+        for slot in slots:
+            f.write(SLOT.pack(*slot))
+        f.write(struct.pack(f"<{len(id_list)}I", *id_list))
+    os.replace(tmp_path, path)
+    return len(postings)
+
+
+class SpellIndex:
+    """Индекс удалений над частотным словарем в файле, отображенном в память
+
+    Файл открывается при первом обращении. Страницы mmap только читаются,
+    поэтому воркеры, открывшие один файл, делят их через кеш ОС.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _ensure_open(self) -> mmap.mmap:
+        if self._mm is not None:
+            return self._mm
+
+        with self._lock:
+            if self._mm is None:
+                with open(self.path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                (
+                    magic,
+                    self.max_distance,
+                    self.prefix_length,
+                    self.word_count,
+                    self.slot_count,
+                    self._words_offset,
+                    self._word_table_offset,
+                    self._slots_offset,
+                    self._postings_offset,
+                ) = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC:
+                    mm.close()
+                    raise ValueError(f"{self.path} не является индексом словаря")
+                self._mask = self.slot_count - 1
+                self._mm = mm
+                logger.info(f"Индекс словаря загружен: {self.word_count} слов")
+        return self._mm
+
+    def _word(self, word_id: int) -> Tuple[str, int]:
+        offset, length, frequency = WORD.unpack_from(
+            self._mm, self._word_table_offset + word_id * WORD.size
+        )
+        start = self._words_offset + offset
+        return self._mm[start : start + length].decode("utf-8"), frequency
+
+    def _postings(self, key: str) -> Iterable[int]:
+        key_hash = _key_hash(key)
+        position = key_hash & self._mask
+        while True:
+            slot_hash, start, count = SLOT.unpack_from(
+                self._mm, self._slots_offset + position * SLOT.size
+            )
+            if count == 0:
+                return ()
+            if slot_hash == key_hash:
+                return struct.unpack_from(
+                    f"<{count}I", self._mm, self._postings_offset + start * WORD_ID.size
+                )
+            position = (position + 1) & self._mask
+
+    def is_known(self, word: str) -> bool:
+        """Есть ли слово в словаре"""
+        self._ensure_open()
+        return any(self._word(word_id)[0] == word for word_id in self._postings(word))
+
+    def lookup(
+        self, word: str, max_distance: Optional[int] = None, limit: int = 5
+    ) -> List[Tuple[str, int, int]]:
+        """Ближайшие слова: (слово, расстояние, частота) по возрастанию расстояния"""
+        self._ensure_open()
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance)
+
+        candidates: Set[int] = set(self._postings(word))
+        for key in deletes(word[: self.prefix_length], max_distance):
+            candidates.update(self._postings(key))
+
+        results = []
+        for word_id in candidates:
+            candidate, frequency = self._word(word_id)
+            if abs(len(candidate) - len(word)) > max_distance:
+                continue
+            distance = bounded_levenshtein_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                results.append((candidate, distance, frequency))
+
+        results.sort(key=lambda item: (item[1], -item[2], item[0]))
+        return results[:limit]
+
+    def suggestions(self, word: str, limit: int = 5) -> List[str]:
+        """Варианты исправления на расстоянии одной правки (чаще встречающиеся - первыми)"""
+        return [
+            candidate
+            for candidate, distance, _ in self.lookup(word, max_distance=1, limit=limit + 1)
+            if distance > 0
+        ][:limit]
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+
+
+@functools.lru_cache(maxsize=None)
+def get_spell_index(path: str = SPELL_INDEX_PATH) -> Optional[SpellIndex]:
+    """Общий на процесс индекс (None, если файл не задан или отсутствует)"""
+    if not path:
+        return None
+    if not os.path.exists(path):
+        logger.error(f"Индекс словаря {path} не найден")
+        return None
+    return SpellIndex(path)
@@ -0,0 +1,131 @@
+import logging
+import re
+
+
+logger = logging.getLogger(__name__)
+
+# Минимальная схожесть исправления с оригиналом
+MIN_SIMILARITY = 0.6
+
+
+def levenshtein_distance(s1: str, s2: str) -> int:
+    """Вычисление расстояния Левенштейна (полная матрица)"""
+    if len(s1) < len(s2):
+        return levenshtein_distance(s2, s1)
+
+    if len(s2) == 0:
+        return len(s1)
+
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+
+    return previous_row[-1]
+
+
+def bounded_levenshtein_distance(s1: str, s2: str, max_distance: int) -> int:
+    """Расстояние Левенштейна с порогом (битово-параллельный алгоритм Майерса)
+
+    Возвращает точное расстояние, если оно не больше max_distance,
+    иначе - max_distance + 1. Столбец матрицы хранится битами одного
+    целого числа, поэтому на символ приходится константа операций.
+    """
+    limit = max_distance + 1
+    if max_distance < 0:
+        return limit
+
+    # Общие префикс и суффикс не влияют на расстояние
+    start = 0
+    end1, end2 = len(s1), len(s2)
+    while start < end1 and start < end2 and s1[start] == s2[start]:
+        start += 1
+    while end1 > start and end2 > start and s1[end1 - 1] == s2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+    s1, s2 = s1[start:end1], s2[start:end2]
+
+    # s2 - более короткая строка, ее биты образуют столбец
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+
+    n, m = len(s1), len(s2)
+    if n - m > max_distance:
+        return limit
+    if m == 0:
+        return n
+
+    peq = {}
+    for i, c in enumerate(s2):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+
+    for j, c in enumerate(s1, 1):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        # Оставшиеся символы уменьшат расстояние не больше чем на свое число
+        if score - (n - j) > max_distance:
+            return limit
+
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+
+    return score if score <= max_distance else limit
+
+
+def has_significant_changes(original: str, processed: str) -> bool:
+    """Проверка, есть ли существенные изменения между оригиналом и обработанным текстом"""
+    if original == processed:
+        return False
+
+    original_normalized = re.sub(r"\s+", " ", original.strip())
+    processed_normalized = re.sub(r"\s+", " ", processed.strip())
+
+    if original_normalized == processed_normalized:
+        return False
+
+    original_words = re.findall(r"\w+", original.lower())
+    processed_words = re.findall(r"\w+", processed.lower())
+
+    if (
+        len(processed_words) == 0
+        or abs(len(original_words) - len(processed_words))
+        > len(original_words) * 0.5
+    ):
+        return False
+
+    # similarity >= 0.6 равносильно distance <= 0.4 * max_length
+    max_length = max(len(original_normalized), len(processed_normalized))
+    max_distance = int(max_length * (1 - MIN_SIMILARITY))
+    distance = bounded_levenshtein_distance(
+        original_normalized.lower(), processed_normalized.lower(), max_distance
+    )
+
+    if distance > max_distance:
+        logger.warning(
+            f"Слишком большие изменения (схожесть < {MIN_SIMILARITY:.2f}), пропускаем"
+        )
+        return False
+
+    return distance > 0
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Утилита для построения индекса словаря (SPELL_INDEX_PATH)
+
+Читает частотный словарь (слово и частота через пробел, по слову в строке)
+и сохраняет индекс удалений SymSpell в один файл. Бот и воркеры отображают
+файл в память только для чтения, поэтому он строится заранее, а не при запуске.
+
+Запуск: python build_spell_index.py ru_frequency.txt spell_index.bin
+"""
+import argparse
+import time
+
+from bot.utils.spell_index import build_index, read_frequency_dictionary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение индекса словаря")
+    parser.add_argument("dictionary", help="частотный словарь")
+    parser.add_argument("output", help="файл индекса")
+    parser.add_argument(
+        "--max-distance",
+        type=int,
+        default=1,
+        help="максимальное расстояние правки (2 - в несколько раз больше файл)",
+    )
+    parser.add_argument(
+        "--prefix-length", type=int, default=7, help="длина префикса для удалений"
+    )
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    words = read_frequency_dictionary(args.dictionary)
+    keys = build_index(words, args.output, args.max_distance, args.prefix_length)
+    print(
+        f"Слов: {len(words)}, ключей: {keys}, "
+        f"время: {time.monotonic() - started:.1f} с -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import secrets
 from dotenv import load_dotenv
 import os
 
@@ -8,10 +9,28 @@ load_dotenv()
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from bot.handlers import start, user_management, settings
-from bot.database.database import init_db
+from bot.handlers.user_management import userbot_service, pending_logins
+from bot.database.database import (
+    db_pool,
+    init_db,
+    close_db,
+    CorrectionCacheDatabase,
+    PendingLoginDatabase,
+    UserDatabase,
+)
+from bot.database.fsm_storage import SQLiteStorage
+from bot.database.user_registry import user_registry, USER_REGISTRY_MAX_SIZE
+from bot.services.correction_cache import CORRECTION_CACHE_TTL
+from bot.services.text_executor import text_executor
 from bot.middlewares.auth import AuthMiddleware
+from bot.middlewares.in_flight import InFlightLimitMiddleware, WEBHOOK_MAX_IN_FLIGHT
+from bot.utils.encryption import session_crypto
+from bot.utils.metrics import metrics, start_metrics_server
+from bot.database.settings_cache import settings_cache
 
 
 logging.basicConfig(
@@ -19,6 +38,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    """Получение апдейтов через getUpdates"""
+    await bot.delete_webhook(drop_pending_updates=True)
+    await dp.start_polling(bot)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Прием апдейтов локальным aiohttp-сервером"""
+    if not WEBHOOK_URL:
+        raise RuntimeError("Для BOT_MODE=webhook нужен WEBHOOK_URL")
+
+    # Без заданного секрета генерируем новый при каждом запуске
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    # Ответ Telegram отдается после обработки: пока все места заняты, запросы
+    # ждут, и Telegram не шлет больше WEBHOOK_MAX_CONNECTIONS апдейтов сразу
+    in_flight_limit = WEBHOOK_MAX_CONNECTIONS
+    if WEBHOOK_MAX_IN_FLIGHT > 0:
+        in_flight_limit = min(WEBHOOK_MAX_IN_FLIGHT, WEBHOOK_MAX_CONNECTIONS)
+    in_flight = InFlightLimitMiddleware(in_flight_limit)
+    dp.update.outer_middleware(in_flight)
+    metrics.add_collector("webhook", in_flight.stats)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=secret_token,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret_token,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        logger.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 
 async def main():
     """Главная функция запуска бота"""
@@ -30,9 +107,18 @@ async def main():
 
     bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 
-    dp = Dispatcher()
+    storage = SQLiteStorage(db_pool)
+    dp = Dispatcher(storage=storage)
+
+    # PBKDF2 для ключа шифрования считаем в потоке, пока поднимается остальное
+    key_warm_up = asyncio.create_task(asyncio.to_thread(session_crypto.warm_up))
 
     await init_db()
+    await CorrectionCacheDatabase.purge_expired(CORRECTION_CACHE_TTL)
+    await PendingLoginDatabase.purge_expired()
+
+    user_registry.warm(await UserDatabase.get_recent_users(USER_REGISTRY_MAX_SIZE))
+    user_registry.start(UserDatabase.add_users)
 
     dp.message.middleware(AuthMiddleware())
     dp.callback_query.middleware(AuthMiddleware())
@@ -41,14 +127,45 @@ async def main():
     dp.include_router(user_management.router)
     dp.include_router(settings.router)
 
-    logger.info("Бот запускается...")
-
     try:
+        await key_warm_up
+    except Exception as e:
+        logger.warning(f"Ключ шифрования не подготовлен: {e}")
+
+    metrics.add_collector("userbot", userbot_service.stats)
+    metrics.add_collector("pending_logins", pending_logins.stats)
+    metrics.add_collector("settings_cache", settings_cache.stats)
+    metrics.add_collector("user_registry", user_registry.stats)
+    metrics.add_collector("fsm_storage", storage.stats)
+    metrics.add_collector("text_executor", text_executor.stats)
+
+    metrics_runner = None
+    restore_task = None
+    try:
+        metrics_runner = await start_metrics_server()
+
+        logger.info("Бот запускается...")
+
+        # User-боты поднимаются в фоне, не задерживая запуск бота
+        restore_task = asyncio.create_task(userbot_service.restore_active_bots())
 
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await run_polling(dp, bot)
     finally:
+        if restore_task is not None:
+            restore_task.cancel()
+            await asyncio.gather(restore_task, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await userbot_service.stop_all_user_bots()
+        await pending_logins.close()
         await bot.session.close()
+        await user_registry.close()
+        await storage.close()
+        await close_db()
+        text_executor.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Утилита для ротации ключа шифрования сессий
+
+Перешифровывает user_bots.session_string и telethon_sessions.session_data
+новым ключом пакетами, распределяя работу Fernet по процессам.
+Строки, уже зашифрованные новым ключом, пропускаются, поэтому
+после прерывания утилиту можно просто запустить снова.
+
+Порядок ротации:
+1. Сгенерируйте новый ключ: python generate_key.py
+2. В .env: ENCRYPTION_KEY=<новый>, ENCRYPTION_KEYS_PREVIOUS=<старый>
+   и перезапустите бота - он читает сессии обоими ключами
+3. Запустите: python rotate_key.py
+4. Уберите ENCRYPTION_KEYS_PREVIOUS после успешного завершения
+"""
+import argparse
+import base64
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from cryptography.fernet import InvalidToken, MultiFernet
+
+from bot.utils.encryption import derive_fernet, previous_encryption_keys
+
+# (таблица, первичный ключ, столбец с зашифрованными данными)
+ENCRYPTED_COLUMNS = [
+    ("user_bots", "id", "session_string"),
+    ("telethon_sessions", "user_id", "session_data"),
+    ("pending_logins", "user_id", "session_data"),
+    ("fsm_states", "storage_key", "data"),
+]
+
+_current = None
+_keyring = None
+
+
+def _init_worker(new_key: str, old_keys: List[str]):
+    """Вывод ключей один раз на процесс"""
+    global _current, _keyring
+    _current = derive_fernet(new_key)
+    _keyring = MultiFernet([_current, *(derive_fernet(key) for key in old_keys)])
+
+
+def _reencrypt(value: str) -> Tuple[str, Optional[str]]:
+    """Статус и новое значение: rotated / skipped (уже новым ключом) / failed"""
+    try:
+        token = base64.b64decode(value.encode("utf-8"))
+    except ValueError:
+        return "failed", None
+
+    try:
+        _current.decrypt(token)
+        return "skipped", None
+    except InvalidToken:
+        pass
+
+    try:
+        rotated = _keyring.rotate(token)
+    except InvalidToken:
+        return "failed", None
+    return "rotated", base64.b64encode(rotated).decode("utf-8")
+
+
+def _rotate_batch(rows, executor: ProcessPoolExecutor, chunksize: int):
+    values = [row[1] for row in rows]
+    return list(executor.map(_reencrypt, values, chunksize=chunksize))
+
+
+def rotate_table(
+    db: sqlite3.Connection,
+    executor: ProcessPoolExecutor,
+    table: str,
+    key_column: str,
+    value_column: str,
+    batch_size: int,
+    workers: int,
+) -> dict:
+    """Перешифровка одной таблицы пакетами по первичному ключу"""
+    counters = {"rotated": 0, "skipped": 0, "failed": 0, "changed": 0}
+    last_key = None
+
+    while True:
+        if last_key is None:
+            query = f"SELECT {key_column}, {value_column} FROM {table} WHERE {value_column} != '' ORDER BY {key_column} LIMIT ?"
+            rows = db.execute(query, (batch_size,)).fetchall()
+        else:
+            query = f"SELECT {key_column}, {value_column} FROM {table} WHERE {value_column} != '' AND {key_column} > ? ORDER BY {key_column} LIMIT ?"
+            rows = db.execute(query, (last_key, batch_size)).fetchall()
+
+        if not rows:
+            return counters
+
+        results = _rotate_batch(rows, executor, max(1, len(rows) // (workers * 4)))
+
+        # Один пакет - одна транзакция; строку, измененную ботом за это время, не трогаем
+        with db:
+            for (row_key, old_value), (status, new_value) in zip(rows, results):
+                counters[status] += 1
+                if status != "rotated":
+                    continue
+                cursor = db.execute(
+                    f"UPDATE {table} SET {value_column} = ? WHERE {key_column} = ? AND {value_column} = ?",
+                    (new_value, row_key, old_value),
+                )
+                if cursor.rowcount == 0:
+                    counters["rotated"] -= 1
+                    counters["changed"] += 1
+
+        last_key = rows[-1][0]
+        print(f"  {table}: обработано до {key_column}={last_key} {counters}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ротация ключа шифрования сессий")
+    parser.add_argument("--database", default=os.getenv("DATABASE_PATH", "bot_database.db"))
+    parser.add_argument("--new-key", default=os.getenv("ENCRYPTION_KEY"))
+    parser.add_argument(
+        "--old-key",
+        action="append",
+        default=None,
+        help="Прежний ключ (можно указать несколько раз); по умолчанию ENCRYPTION_KEYS_PREVIOUS",
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    old_keys = args.old_key or previous_encryption_keys()
+    if not args.new_key:
+        print("❌ Новый ключ не задан (ENCRYPTION_KEY или --new-key)")
+        return 1
+    if not old_keys:
+        print("❌ Прежние ключи не заданы (ENCRYPTION_KEYS_PREVIOUS или --old-key)")
+        return 1
+
+    db = sqlite3.connect(args.database, timeout=30)
+    db.execute("PRAGMA busy_timeout = 30000")
+
+    started_at = time.monotonic()
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(args.new_key, old_keys),
+    ) as executor:
+        for table, key_column, value_column in ENCRYPTED_COLUMNS:
+            exists = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            if not exists:
+                continue
+
+            print(f"🔄 {table}.{value_column}")
+            counters = rotate_table(
+                db, executor, table, key_column, value_column, args.batch_size, args.workers
+            )
+            failed += counters["failed"]
+            print(f"✅ {table}: {counters}")
+
+    db.close()
+    print(f"\n⏱  Готово за {time.monotonic() - started_at:.1f} с")
+
+    if failed:
+        print(f"⚠️  {failed} строк не дешифруется ни одним ключом - они оставлены как есть")
+        return 2
+    print("📝 Теперь можно убрать ENCRYPTION_KEYS_PREVIOUS из .env")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())